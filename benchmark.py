@@ -0,0 +1,354 @@
+# Benchmarks for the generation, grading and persistence hot paths: python benchmark.py --help
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+from database import QuizDatabase
+from grading import evaluation_cache_key, grade_locally
+from llm_backend import EVALUATION, LLMResponse, ReplayBackend
+from near_duplicates import NearDuplicateIndex
+from question_generation import GRAMMAR_TOPICS, call_llm
+from question_validation import QuestionValidator
+from rate_limiter import INTERACTIVE, RateLimiter
+from response_parser import IncrementalArrayParser, parse_json_array, parse_json_object
+
+# History sizes for the database benchmarks, questions per seeded session, and the history page size
+DB_SIZES = [1000, 100000, 1000000]
+QUESTIONS_PER_SESSION = 10
+HISTORY_PAGE_SIZE = 20
+
+# Relative slowdown (of the median) reported as a regression against the baseline
+REGRESSION_THRESHOLD = 0.2
+
+MCQ = "Multiple Choice (MCQ)"
+TRUE_FALSE = "True/False"
+SHORT_ANSWER = "Short Answer"
+WRITE_TOPIC = "Benchmark Writes"
+PAGES = ["Generate Quiz", "Statistics", "Quiz History"]
+
+
+def measure(function: Callable, runs: int, warmup: int = 1) -> Dict:
+    """Call function warmup + runs times and summarise the timed runs in milliseconds"""
+    for _ in range(warmup):
+        function()
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        'runs': runs,
+        'median_ms': statistics.median(samples),
+        'mean_ms': statistics.fmean(samples),
+        'p95_ms': samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        'min_ms': samples[0]
+    }
+
+
+def sample_questions(count: int, question_type: str = MCQ, seed: int = 0) -> List[Dict]:
+    """A generated batch shaped like a model reply, with distinct wording per question"""
+    rng = random.Random(seed)
+    words = ["apple", "river", "teacher", "window", "yesterday", "garden", "letter", "quickly", "train", "music"]
+    questions = []
+    for i in range(count):
+        subject = " ".join(rng.sample(words, 4))
+        question = {
+            'question': f"Question {seed}-{i}: choose the correct form to complete the sentence about {subject}.",
+            'type': question_type,
+            'correct_answer': "has gone" if question_type == MCQ else "True",
+            'explanation': "The present perfect links a past action to the present.",
+            'difficulty': "Medium"
+        }
+        if question_type == MCQ:
+            question['options'] = ["has gone", "have gone", "went", "going"]
+        questions.append(question)
+    return questions
+
+
+def bench_parsing(runs: int) -> Dict[str, Dict]:
+    """Parse, repair, stream and validate generated batches"""
+    batch = sample_questions(10)
+    clean = json.dumps(batch)
+    # The kind of reply repair_json exists for: prose around it, trailing commas, Python literals
+    messy = "Here are your questions:\n```json\n" + clean.replace('"}', '",}').replace('"Medium"', 'None') + "\n```"
+    chunks = [clean[start:start + 200] for start in range(0, len(clean), 200)]
+
+    index = NearDuplicateIndex()
+    for i, question in enumerate(sample_questions(5000, seed=1)):
+        index.add(question['question'], GRAMMAR_TOPICS[i % len(GRAMMAR_TOPICS)])
+
+    def stream_parse():
+        parser = IncrementalArrayParser()
+        for chunk in chunks:
+            parser.feed(chunk)
+
+    def validate():
+        QuestionValidator(MCQ, "Medium").validate_all(parse_json_array(clean))
+
+    def check_repeats():
+        for question in batch:
+            index.find_similar(question['question'])
+
+    return {
+        'parsing/parse_clean_batch': measure(lambda: parse_json_array(clean), runs),
+        'parsing/parse_repaired_batch': measure(lambda: parse_json_array(messy), runs),
+        'parsing/stream_parse_batch': measure(stream_parse, runs),
+        'parsing/parse_and_validate_batch': measure(validate, runs),
+        'parsing/repeat_check_batch_5k_index': measure(check_repeats, runs)
+    }
+
+
+def bench_grading(runs: int, work_dir: str, latency: float) -> Dict[str, Dict]:
+    """Local grading against evaluation through a replayed LLM backend and the evaluation cache"""
+    mcq = sample_questions(1)[0]
+    true_false = sample_questions(1, TRUE_FALSE)[0]
+    short_answer = dict(sample_questions(1, SHORT_ANSWER)[0], correct_answer="She has gone to school.")
+    reply = json.dumps({'is_correct': True, 'score': 9, 'feedback': "Correct use of the present perfect."})
+
+    db = QuizDatabase(os.path.join(work_dir, "grading.database"))
+    backend = ReplayBackend(latency=(latency, latency), seed=0)
+    backend.record(EVALUATION, "recorded evaluation", LLMResponse(reply, 60, 20))
+    limiter = RateLimiter(db, 10 ** 9, 10 ** 9)
+    cache_key = evaluation_cache_key(short_answer, "She has gone to school")
+    db.store_cached_evaluation(cache_key, json.loads(reply))
+
+    def evaluate_with_llm():
+        # What request_evaluation does on a cache miss: key, prompt, limited/resilient call, parse
+        evaluation_cache_key(short_answer, "She has went to school")
+        prompt = f"Evaluate this answer:\n\nQuestion: {short_answer['question']}\n" \
+                 f"Correct Answer: {short_answer['correct_answer']}\nUser's Answer: She has went to school"
+        response = call_llm(limiter, backend, "benchmark evaluate answer", EVALUATION, prompt, INTERACTIVE, 60)
+        parse_json_object(response.text)
+
+    try:
+        return {
+            'grading/local_mcq': measure(lambda: grade_locally(mcq, "have gone"), runs),
+            'grading/local_true_false': measure(lambda: grade_locally(true_false, "false"), runs),
+            'grading/evaluation_cache_hit': measure(lambda: db.get_cached_evaluation(cache_key), runs),
+            'grading/llm_replay': measure(evaluate_with_llm, runs)
+        }
+    finally:
+        db.close()
+
+
+def session_start(session_id: int, seconds: int = 0) -> str:
+    """Timestamp of a seeded session (one a minute), or of an answer seconds into it"""
+    return (datetime(2024, 1, 1) + timedelta(minutes=session_id, seconds=seconds)).isoformat()
+
+
+def seed_history(db_path: str, rows: int) -> QuizDatabase:
+    """Create (or reuse) a database holding rows history answers in sessions of QUESTIONS_PER_SESSION"""
+    db = QuizDatabase(db_path)
+    conn = sqlite3.connect(db_path)
+    existing = conn.execute('SELECT COUNT(*) FROM quiz_history').fetchone()[0]
+    if existing == rows:
+        conn.close()
+        return db
+
+    print(f"  seeding {rows} history rows...", flush=True)
+    conn.execute('DELETE FROM quiz_history')
+    conn.execute('DELETE FROM sessions')
+    conn.execute('DELETE FROM user_stats')
+    rng = random.Random(rows)
+    session_count = (rows + QUESTIONS_PER_SESSION - 1) // QUESTIONS_PER_SESSION
+
+    def sessions():
+        for session_id in range(1, session_count + 1):
+            answered = min(QUESTIONS_PER_SESSION, rows - (session_id - 1) * QUESTIONS_PER_SESSION)
+            yield (session_id, session_start(session_id), answered,
+                   answered * 7, GRAMMAR_TOPICS[session_id % len(GRAMMAR_TOPICS)], answered // 2, answered)
+
+    def history():
+        for row in range(rows):
+            session_id = row // QUESTIONS_PER_SESSION + 1
+            is_correct = rng.random() < 0.6
+            yield (session_id, session_start(session_id, row % QUESTIONS_PER_SESSION),
+                   GRAMMAR_TOPICS[session_id % len(GRAMMAR_TOPICS)], f"Benchmark question {row}?", "answer",
+                   "answer", is_correct, 10 if is_correct else 3, "Feedback for the answer.", MCQ)
+
+    conn.executemany('''
+        INSERT INTO sessions (id, session_start, total_questions, total_score, topics_covered,
+                              correct_count, answered_count)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', sessions())
+    conn.executemany('''
+        INSERT INTO quiz_history
+        (session_id, timestamp, grammar_topic, question, user_answer, correct_answer,
+         is_correct, score, feedback, question_type)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', history())
+    conn.execute('''
+        INSERT INTO user_stats (grammar_topic, total_attempts, correct_attempts, total_score, last_practiced)
+        SELECT grammar_topic, COUNT(*), COUNT(CASE WHEN is_correct = 1 THEN 1 END), SUM(score), MAX(timestamp)
+        FROM quiz_history GROUP BY grammar_topic
+    ''')
+    conn.commit()
+    conn.execute('ANALYZE')
+    conn.close()
+    db.rebuild_overall_stats()
+    return db
+
+
+def bench_database(runs: int, sizes: List[int], db_dir: str) -> Dict[str, Dict]:
+    """History reads and writes at each history size"""
+    results = {}
+    for rows in sizes:
+        db = seed_history(os.path.join(db_dir, f"benchmark_{rows}.database"), rows)
+        session_count = (rows + QUESTIONS_PER_SESSION - 1) // QUESTIONS_PER_SESSION
+        # Keyset of a session half way back through history, for a deep History page
+        middle = (session_start(session_count // 2), session_count // 2)
+        rng = random.Random(0)
+        written_sessions = []
+
+        def create_session():
+            written_sessions.append(db.create_quiz_session(WRITE_TOPIC, 10))
+
+        def write_answer():
+            db.save_to_history(written_sessions[-1], WRITE_TOPIC, "Benchmark write?", "answer", "answer",
+                               True, 10, "Good.", MCQ)
+
+        prefix = f"database/{rows}"
+        results[f"{prefix}/get_quiz_sessions_first_page"] = measure(lambda: db.get_quiz_sessions(HISTORY_PAGE_SIZE), runs)
+        results[f"{prefix}/get_quiz_sessions_deep_page"] = measure(
+            lambda: db.get_quiz_sessions(HISTORY_PAGE_SIZE, middle), runs
+        )
+        results[f"{prefix}/get_session_questions"] = measure(
+            lambda: db.get_session_questions(rng.randint(1, session_count)), runs
+        )
+        results[f"{prefix}/get_overall_stats"] = measure(db.get_overall_stats, runs)
+        results[f"{prefix}/create_quiz_session"] = measure(create_session, runs)
+        results[f"{prefix}/save_to_history"] = measure(write_answer, runs)
+
+        # Take the writes back out so the seeded database can be reused as is
+        for written_session in written_sessions:
+            db.delete_session(written_session)
+        conn = sqlite3.connect(db.db_name)
+        conn.execute('DELETE FROM user_stats WHERE grammar_topic = ?', (WRITE_TOPIC,))
+        conn.commit()
+        conn.close()
+        db.close()
+    return results
+
+
+def bench_pages(runs: int, work_dir: str, history_rows: int) -> Dict[str, Dict]:
+    """Full script reruns of each page through Streamlit's AppTest, against a replayed backend"""
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        print("  skipped: streamlit (with streamlit.testing) is not installed")
+        return {}
+
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app1.py")
+    previous_dir = os.getcwd()
+    # app1 opens chat_history.database in the working directory; give it a seeded copy
+    os.chdir(work_dir)
+    os.environ['LLM_BACKEND'] = "replay"
+    os.environ['LLM_CASSETTE'] = os.path.join(work_dir, "benchmark_cassette.json")
+    try:
+        seed_history(os.path.join(work_dir, "chat_history.database"), history_rows).close()
+        app = AppTest.from_file(script, default_timeout=60)
+        app.run()
+
+        def rerun(page: str):
+            if page == "Quiz History":
+                app.sidebar.button[0].click()
+            else:
+                app.sidebar.radio[0].set_value(page)
+            app.run()
+            if app.exception:
+                raise RuntimeError(f"{page} page raised: {app.exception[0].message}")
+
+        return {
+            f"pages/{page.lower().replace(' ', '_')}": measure(lambda page=page: rerun(page), runs)
+            for page in PAGES
+        }
+    finally:
+        os.chdir(previous_dir)
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float) -> List[str]:
+    """Print each result next to its baseline and return the names that slowed down beyond threshold"""
+    regressions = []
+    print(f"\n{'benchmark':<58} {'median ms':>11} {'baseline':>11} {'change':>8}")
+    for name, result in results.items():
+        base = baseline.get(name)
+        line = f"{name:<58} {result['median_ms']:>11.3f}"
+        if base and base['median_ms'] > 0:
+            change = result['median_ms'] / base['median_ms'] - 1
+            line += f" {base['median_ms']:>11.3f} {change:>+7.0%}"
+            if change > threshold:
+                line += "  REGRESSION"
+                regressions.append(name)
+        print(line)
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the quiz generator's hot paths")
+    parser.add_argument('--suites', nargs='*', default=["parsing", "grading", "database", "pages"],
+                        choices=["parsing", "grading", "database", "pages"])
+    parser.add_argument('--runs', type=int, default=50, help="timed runs per benchmark")
+    parser.add_argument('--sizes', type=int, nargs='*', default=DB_SIZES, help="history rows per database run")
+    parser.add_argument('--db-dir', help="keep seeded databases here and reuse them on later runs")
+    parser.add_argument('--llm-latency', type=float, default=0.0, help="seconds of replayed LLM latency")
+    parser.add_argument('--page-rows', type=int, default=1000, help="history rows behind the page reruns")
+    parser.add_argument('--output', default="benchmark_results.json")
+    parser.add_argument('--baseline', default="benchmark_baseline.json")
+    parser.add_argument('--save-baseline', action='store_true', help="also save these results as the baseline")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help="relative slowdown reported as a regression")
+    args = parser.parse_args(argv)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        db_dir = args.db_dir or work_dir
+        os.makedirs(db_dir, exist_ok=True)
+        for suite in args.suites:
+            print(f"Running {suite} benchmarks", flush=True)
+            if suite == "parsing":
+                results.update(bench_parsing(args.runs))
+            elif suite == "grading":
+                results.update(bench_grading(args.runs, work_dir, args.llm_latency))
+            elif suite == "database":
+                results.update(bench_database(args.runs, args.sizes, db_dir))
+            elif suite == "pages":
+                results.update(bench_pages(max(1, args.runs // 10), work_dir, args.page_rows))
+
+    report = {
+        'created': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+    regressions = compare(results, baseline, args.threshold)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved baseline to {args.baseline}")
+    print(f"Results written to {args.output}")
+    if regressions:
+        print(f"{len(regressions)} regression(s) over {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
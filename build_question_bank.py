@@ -0,0 +1,160 @@
+# Offline, resumable question bank builder: python build_question_bank.py --help
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Tuple
+
+from dotenv import load_dotenv
+
+from database import QuizDatabase
+from llm_backend import GeminiBackend, backend_from_env
+from llm_metrics import LLMMetrics
+from model_client import DEFAULT_MODEL
+from near_duplicates import NearDuplicateIndex
+from question_generation import DIFFICULTY_LEVELS, QUESTION_TYPES, QuestionGenerator, quiz_topics
+from rate_limiter import GENERATION, RateLimiter, RateLimitExceeded
+
+Combination = Tuple[str, str, str]
+
+
+def load_checkpoint(path: str) -> Dict:
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    return {'completed': [], 'failed': {}}
+
+
+def save_checkpoint(path: str, checkpoint: Dict):
+    """Write the checkpoint atomically so a crash never leaves it half written"""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(temp_path, path)
+
+
+def plan_combinations(args, checkpoint: Dict) -> List[Combination]:
+    """Combinations still to fill, skipping completed ones"""
+    completed = {tuple(item) for item in checkpoint['completed']}
+    return [
+        (topic, question_type, difficulty)
+        for topic in (args.topics or quiz_topics())
+        for question_type in (args.types or QUESTION_TYPES)
+        for difficulty in (args.difficulties or DIFFICULTY_LEVELS)
+        if (topic, question_type, difficulty) not in completed
+    ]
+
+
+def fill_combination(generator: QuestionGenerator, db: QuizDatabase, combination: Combination,
+                     target: int, batch_size: int, stop: threading.Event) -> Tuple[int, int]:
+    """Generate batches until the combination holds target questions; returns (added, batches requested)"""
+    added = 0
+    batches = 0
+    while not stop.is_set():
+        missing = target - db.count_bank_questions(*combination)
+        if missing <= 0:
+            break
+        questions = generator.request_batch_questions(*combination, min(batch_size, missing), priority=GENERATION)
+        batches += 1
+        new = db.add_bank_questions(*combination, questions)
+        added += new
+        if new == 0:
+            # Nothing usable came back; leave it for the next run rather than spend the budget
+            break
+    return added, batches
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Pre-populate the question bank with generated questions")
+    parser.add_argument('--db', default="chat_history.database", help="SQLite database to fill")
+    parser.add_argument('--target', type=int, default=20, help="unseen questions to hold per combination")
+    parser.add_argument('--batch-size', type=int, default=10, help="questions per generation request")
+    parser.add_argument('--workers', type=int, default=2, help="combinations generated concurrently")
+    parser.add_argument('--per-minute', type=int, default=10, help="request budget per minute")
+    parser.add_argument('--per-day', type=int, default=50, help="request budget per day")
+    parser.add_argument('--model', default=os.getenv("GEMINI_MODEL", DEFAULT_MODEL))
+    parser.add_argument('--checkpoint', default="question_bank_checkpoint.json")
+    parser.add_argument('--topics', nargs='*', help="only these topics (default: all)")
+    parser.add_argument('--types', nargs='*', help="only these question types (default: all)")
+    parser.add_argument('--difficulties', nargs='*', help="only these difficulties (default: all)")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    backend = backend_from_env(args.model)
+    if isinstance(backend, GeminiBackend) or getattr(backend, 'record_from', None):
+        # Only real Gemini requests need a key; a replay cassette runs offline
+        import google.generativeai as genai
+        api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
+        if not api_key:
+            print("Set GEMINI_API_KEY (or GOOGLE_API_KEY) in the environment or .env", file=sys.stderr)
+            return 2
+        genai.configure(api_key=api_key)
+
+    db = QuizDatabase(args.db)
+    index = NearDuplicateIndex()
+    index.refresh(db)
+    metrics = LLMMetrics(db)
+    generator = QuestionGenerator(
+        db, RateLimiter(db, args.per_minute, args.per_day), index, backend, metrics=metrics
+    )
+
+    checkpoint = load_checkpoint(args.checkpoint)
+    combinations = plan_combinations(args, checkpoint)
+    print(f"{len(combinations)} combination(s) to fill, {len(checkpoint['completed'])} already done")
+
+    stop = threading.Event()
+    started = time.monotonic()
+    totals = {'done': 0, 'questions': 0, 'batches': 0}
+
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = {
+            executor.submit(fill_combination, generator, db, combination, args.target, args.batch_size, stop): combination
+            for combination in combinations
+        }
+        for future in as_completed(futures):
+            if future.cancelled():
+                continue
+            combination = futures[future]
+            label = " / ".join(combination)
+            try:
+                added, batches = future.result()
+            except RateLimitExceeded as e:
+                # Out of budget: stop scheduling and resume from the checkpoint next run
+                if not stop.is_set():
+                    print(f"Stopping: {e}")
+                    stop.set()
+                    for pending in futures:
+                        pending.cancel()
+                continue
+            except Exception as e:
+                checkpoint['failed']["|".join(combination)] = str(e)
+                save_checkpoint(args.checkpoint, checkpoint)
+                print(f"  failed  {label}: {e}")
+                continue
+
+            totals['questions'] += added
+            totals['batches'] += batches
+            if db.count_bank_questions(*combination) >= args.target:
+                totals['done'] += 1
+                checkpoint['completed'].append(list(combination))
+                checkpoint['failed'].pop("|".join(combination), None)
+                save_checkpoint(args.checkpoint, checkpoint)
+
+            elapsed = time.monotonic() - started
+            rate = totals['questions'] / elapsed * 60 if elapsed else 0.0
+            print(f"[{totals['done']}/{len(combinations)}] {label}: +{added} questions "
+                  f"({totals['questions']} total, {totals['batches']} batches, {rate:.1f} questions/min)")
+
+    metrics.flush()
+    elapsed = time.monotonic() - started
+    remaining = len(combinations) - totals['done']
+    print(f"Added {totals['questions']} questions in {totals['batches']} batches over {elapsed:.0f}s; "
+          f"{remaining} combination(s) left" + (" (run again to resume)" if remaining else ""))
+    return 0 if not remaining else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,15 +1,255 @@
+import json
+import queue
 import sqlite3
-from datetime import datetime
-from typing import Dict, List, Optional
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+# Idle connections kept open for reuse, and per-connection tuning
+POOL_SIZE = 8
+CACHE_SIZE_KB = 16384
+MMAP_SIZE = 64 * 1024 * 1024
+
+# Schema migrations applied in order by init_database(), tracked in PRAGMA user_version
+MIGRATIONS = [
+    # 1: indexes for the history, topic and session access paths
+    [
+        'CREATE INDEX IF NOT EXISTS idx_quiz_history_session ON quiz_history (session_id, timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_quiz_history_topic ON quiz_history (grammar_topic, timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_quiz_history_timestamp ON quiz_history (timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_sessions_start ON sessions (session_start)'
+    ],
+    # 2: single-row running totals behind get_overall_stats(), backfilled from history
+    [
+        '''CREATE TABLE IF NOT EXISTS overall_stats (
+               id INTEGER PRIMARY KEY CHECK (id = 1),
+               total_questions INTEGER NOT NULL DEFAULT 0,
+               correct_answers INTEGER NOT NULL DEFAULT 0,
+               total_score INTEGER NOT NULL DEFAULT 0
+           )''',
+        '''INSERT OR REPLACE INTO overall_stats (id, total_questions, correct_answers, total_score)
+           SELECT 1, COUNT(*), COUNT(CASE WHEN is_correct = 1 THEN 1 END), COALESCE(SUM(score), 0)
+           FROM quiz_history'''
+    ],
+    # 3: per-session answered/correct counts, backfilled from history
+    [
+        'ALTER TABLE sessions ADD COLUMN correct_count INTEGER DEFAULT 0',
+        'ALTER TABLE sessions ADD COLUMN answered_count INTEGER DEFAULT 0',
+        '''UPDATE sessions SET
+               correct_count = (SELECT COUNT(*) FROM quiz_history h
+                                WHERE h.session_id = sessions.id AND h.is_correct = 1),
+               answered_count = (SELECT COUNT(*) FROM quiz_history h
+                                 WHERE h.session_id = sessions.id)'''
+    ],
+    # 4: evaluations keyed by a hash of the normalized (question, correct answer, user answer)
+    [
+        '''CREATE TABLE IF NOT EXISTS evaluation_cache (
+               cache_key TEXT PRIMARY KEY,
+               evaluation TEXT NOT NULL,
+               created_at TEXT NOT NULL,
+               last_used TEXT NOT NULL,
+               hits INTEGER NOT NULL DEFAULT 0
+           )''',
+        'CREATE INDEX IF NOT EXISTS idx_evaluation_cache_last_used ON evaluation_cache (last_used)'
+    ],
+    # 5: token buckets for the Gemini rate limiter, shared by every session and process
+    [
+        '''CREATE TABLE IF NOT EXISTS rate_limit_buckets (
+               name TEXT PRIMARY KEY,
+               tokens REAL NOT NULL,
+               updated_at REAL NOT NULL
+           )'''
+    ],
+    # 6: one row per LLM call (or evaluation cache hit) for the operator metrics
+    [
+        '''CREATE TABLE IF NOT EXISTS llm_calls (
+               id INTEGER PRIMARY KEY AUTOINCREMENT,
+               timestamp TEXT NOT NULL,
+               call_site TEXT NOT NULL,
+               question_type TEXT,
+               difficulty TEXT,
+               outcome TEXT NOT NULL,
+               cache_hit INTEGER NOT NULL DEFAULT 0,
+               latency_ms REAL NOT NULL,
+               prompt_tokens INTEGER,
+               response_tokens INTEGER
+           )''',
+        'CREATE INDEX IF NOT EXISTS idx_llm_calls_timestamp ON llm_calls (timestamp)'
+    ],
+    # 7: banked questions that were already answered (streamed live, then banked) count as served
+    [
+        '''UPDATE question_bank SET times_served = 1, last_served = created_at
+           WHERE times_served = 0 AND question IN (SELECT question FROM quiz_history)'''
+    ],
+    # 8: running LLM call totals behind get_llm_call_summary(), backfilled from llm_calls
+    [
+        '''CREATE TABLE IF NOT EXISTS llm_call_totals (
+               call_site TEXT NOT NULL,
+               question_type TEXT NOT NULL DEFAULT '',
+               difficulty TEXT NOT NULL DEFAULT '',
+               calls INTEGER NOT NULL DEFAULT 0,
+               cache_hits INTEGER NOT NULL DEFAULT 0,
+               ok INTEGER NOT NULL DEFAULT 0,
+               parse_fail INTEGER NOT NULL DEFAULT 0,
+               quota INTEGER NOT NULL DEFAULT 0,
+               timeout INTEGER NOT NULL DEFAULT 0,
+               latency_ms REAL NOT NULL DEFAULT 0,
+               timed_calls INTEGER NOT NULL DEFAULT 0,
+               prompt_tokens INTEGER NOT NULL DEFAULT 0,
+               prompt_metered INTEGER NOT NULL DEFAULT 0,
+               response_tokens INTEGER NOT NULL DEFAULT 0,
+               response_metered INTEGER NOT NULL DEFAULT 0,
+               PRIMARY KEY (call_site, question_type, difficulty)
+           )''',
+        '''INSERT OR REPLACE INTO llm_call_totals
+           SELECT call_site, COALESCE(question_type, ''), COALESCE(difficulty, ''), COUNT(*), SUM(cache_hit),
+                  COUNT(CASE WHEN outcome = 'ok' THEN 1 END),
+                  COUNT(CASE WHEN outcome = 'parse_fail' THEN 1 END),
+                  COUNT(CASE WHEN outcome = 'quota' THEN 1 END),
+                  COUNT(CASE WHEN outcome = 'timeout' THEN 1 END),
+                  COALESCE(SUM(CASE WHEN cache_hit = 0 THEN latency_ms END), 0),
+                  COUNT(CASE WHEN cache_hit = 0 THEN 1 END),
+                  COALESCE(SUM(prompt_tokens), 0), COUNT(prompt_tokens),
+                  COALESCE(SUM(response_tokens), 0), COUNT(response_tokens)
+           FROM llm_calls
+           GROUP BY call_site, COALESCE(question_type, ''), COALESCE(difficulty, '')'''
+    ]
+]
+
+# Evaluation cache limits: entries kept, and age in seconds after which an answer is re-graded
+EVALUATION_CACHE_MAX_ENTRIES = 5000
+EVALUATION_CACHE_TTL = 30 * 24 * 3600
+
+# Most recent LLM call records kept in llm_calls
+LLM_CALLS_MAX_ROWS = 100000
+
+# Adds one call to its llm_call_totals row: (call site, question type, difficulty, cache hit,
+# ok, parse_fail, quota, timeout, latency_ms, timed, prompt tokens, prompt metered, response tokens, response metered)
+UPDATE_LLM_CALL_TOTALS = '''
+    INSERT INTO llm_call_totals
+    (call_site, question_type, difficulty, calls, cache_hits, ok, parse_fail, quota, timeout,
+     latency_ms, timed_calls, prompt_tokens, prompt_metered, response_tokens, response_metered)
+    VALUES (?, ?, ?, 1, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(call_site, question_type, difficulty) DO UPDATE SET
+        calls = calls + 1,
+        cache_hits = cache_hits + excluded.cache_hits,
+        ok = ok + excluded.ok,
+        parse_fail = parse_fail + excluded.parse_fail,
+        quota = quota + excluded.quota,
+        timeout = timeout + excluded.timeout,
+        latency_ms = latency_ms + excluded.latency_ms,
+        timed_calls = timed_calls + excluded.timed_calls,
+        prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+        prompt_metered = prompt_metered + excluded.prompt_metered,
+        response_tokens = response_tokens + excluded.response_tokens,
+        response_metered = response_metered + excluded.response_metered
+'''
+
+# Adjusts the overall_stats totals by (questions, correct answers, score)
+UPDATE_OVERALL_STATS = '''
+    UPDATE overall_stats
+    SET total_questions = total_questions + ?,
+        correct_answers = correct_answers + ?,
+        total_score = total_score + ?
+    WHERE id = 1
+'''
+
+CHAT_HISTORY_QUERY = '''
+    SELECT timestamp, grammar_topic, question, user_answer,
+           correct_answer, is_correct, score, feedback, question_type
+    FROM quiz_history
+    ORDER BY timestamp DESC
+    LIMIT ?
+'''
+
+QUIZ_SESSIONS_QUERY = '''
+    SELECT id, session_start, total_questions, total_score, topics_covered,
+           correct_count, answered_count
+    FROM sessions
+    ORDER BY session_start DESC, id DESC
+    LIMIT ?
+'''
+
+# Keyset page: sessions strictly older than the (session_start, id) of the last row shown
+QUIZ_SESSIONS_BEFORE_QUERY = '''
+    SELECT id, session_start, total_questions, total_score, topics_covered,
+           correct_count, answered_count
+    FROM sessions
+    WHERE (session_start, id) < (?, ?)
+    ORDER BY session_start DESC, id DESC
+    LIMIT ?
+'''
+
+SESSION_QUESTIONS_QUERY = '''
+    SELECT timestamp, grammar_topic, question, user_answer,
+           correct_answer, is_correct, score, feedback, question_type
+    FROM quiz_history
+    WHERE session_id = ?
+    ORDER BY timestamp ASC, id ASC
+'''
+
+TOPIC_HISTORY_QUERY = '''
+    SELECT timestamp, question, user_answer, correct_answer,
+           is_correct, score, feedback, question_type
+    FROM quiz_history
+    WHERE grammar_topic = ?
+    ORDER BY timestamp DESC
+    LIMIT ?
+'''
+
+# Queries checked by check_query_plans(): sample parameters and the index each must use
+INDEXED_QUERIES = {
+    'get_chat_history': (CHAT_HISTORY_QUERY, (50,), 'idx_quiz_history_timestamp'),
+    'get_quiz_sessions': (QUIZ_SESSIONS_QUERY, (50,), 'idx_sessions_start'),
+    'get_quiz_sessions (next page)': (QUIZ_SESSIONS_BEFORE_QUERY, ('2024-01-01', 1, 50), 'idx_sessions_start'),
+    'get_session_questions': (SESSION_QUESTIONS_QUERY, (1,), 'idx_quiz_history_session'),
+    'get_topic_history': (TOPIC_HISTORY_QUERY, ('Tenses', 20), 'idx_quiz_history_topic')
+}
 
 class QuizDatabase:
-    def __init__(self, db_name="chat_history.database"):
+    def __init__(self, db_name="chat_history.database", pool_size: int = POOL_SIZE):
         self.db_name = db_name
+        self._pool = queue.LifoQueue(maxsize=pool_size)
         self.init_database()
 
+    def _create_connection(self) -> sqlite3.Connection:
+        """Open a connection and apply the per-connection pragmas once"""
+        conn = sqlite3.connect(self.db_name, timeout=10.0, check_same_thread=False)
+        # WAL lets readers (history, statistics) run while another session writes
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        conn.execute(f'PRAGMA cache_size = -{CACHE_SIZE_KB}')
+        conn.execute(f'PRAGMA mmap_size = {MMAP_SIZE}')
+        conn.execute('PRAGMA temp_store = MEMORY')
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        """Borrow a prepared connection from the pool, opening one if none is idle"""
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            return self._create_connection()
+
+    def _release(self, conn: sqlite3.Connection):
+        """Return a connection to the pool, discarding any unfinished transaction"""
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close(self):
+        """Close all idle pooled connections"""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
     def init_database(self):
         """Initialize SQLite database for quiz history"""
-        conn = sqlite3.connect(self.db_name)
+        conn = self._acquire()
         cursor = conn.cursor()
 
         # Create quiz_history table
@@ -53,12 +293,65 @@ class QuizDatabase:
             )
         ''')
 
+        # Create question_bank table for reusing generated questions
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS question_bank (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                grammar_topic TEXT NOT NULL,
+                question_type TEXT NOT NULL,
+                difficulty TEXT NOT NULL,
+                question TEXT NOT NULL,
+                question_data TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                times_served INTEGER DEFAULT 0,
+                last_served TEXT,
+                UNIQUE (grammar_topic, question_type, difficulty, question)
+            )
+        ''')
+
         conn.commit()
+
+        self._migrate(conn)
+        self._release(conn)
+
+    def _migrate(self, conn: sqlite3.Connection):
+        """Apply schema migrations newer than the database's user_version"""
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+
+        for target, statements in enumerate(MIGRATIONS[version:], version + 1):
+            try:
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute(f'PRAGMA user_version = {target}')
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def check_query_plans(self) -> Dict[str, List[str]]:
+        """Return the EXPLAIN QUERY PLAN of every query that no longer uses its index"""
+        # A fresh connection, since cached EXPLAIN statements are not re-planned after schema changes
+        conn = self._create_connection()
+        cursor = conn.cursor()
+
+        regressions = {}
+        for name, (query, params, index) in INDEXED_QUERIES.items():
+            cursor.execute('EXPLAIN QUERY PLAN ' + query, params)
+            plan = [row[3] for row in cursor.fetchall()]
+
+            uses_index = any(index in step for step in plan)
+            full_scan = any(step.startswith('SCAN') and 'INDEX' not in step for step in plan)
+            sorts = any('TEMP B-TREE' in step for step in plan)
+            if not uses_index or full_scan or sorts:
+                regressions[name] = plan
+
         conn.close()
 
+        return regressions
+
     def create_quiz_session(self, grammar_topic: str, total_questions: int) -> int:
         """Create a new quiz session and return session_id"""
-        conn = sqlite3.connect(self.db_name, timeout=10.0)
+        conn = self._acquire()
         cursor = conn.cursor()
 
         try:
@@ -75,13 +368,13 @@ class QuizDatabase:
             conn.commit()
             return session_id
         finally:
-            conn.close()
+            self._release(conn)
 
     def save_to_history(self, session_id: int, grammar_topic: str, question: str, user_answer: str,
                        correct_answer: str, is_correct: bool, score: int,
                        feedback: str, question_type: str):
         """Save quiz interaction to database"""
-        conn = sqlite3.connect(self.db_name, timeout=10.0)
+        conn = self._acquire()
         cursor = conn.cursor()
 
         try:
@@ -122,13 +415,92 @@ class QuizDatabase:
                 datetime.now().isoformat()
             ))
 
+            cursor.execute(UPDATE_OVERALL_STATS, (1, 1 if is_correct else 0, score or 0))
+
+            cursor.execute('''
+                UPDATE sessions
+                SET answered_count = answered_count + 1,
+                    correct_count = correct_count + ?
+                WHERE id = ?
+            ''', (1 if is_correct else 0, session_id))
+
             conn.commit()
         finally:
-            conn.close()
+            self._release(conn)
+
+    def save_quiz_results(self, session_id: int, results: List[Dict]):
+        """Save all answers of a finished quiz, its topic stats and session score in one transaction"""
+        conn = self._acquire()
+        cursor = conn.cursor()
+
+        try:
+            now = datetime.now().isoformat()
+
+            cursor.executemany('''
+                INSERT INTO quiz_history
+                (session_id, timestamp, grammar_topic, question, user_answer, correct_answer,
+                 is_correct, score, feedback, question_type)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [(
+                session_id,
+                now,
+                result['grammar_topic'],
+                result['question'],
+                result['user_answer'],
+                result['correct_answer'],
+                result['is_correct'],
+                result['score'],
+                result['feedback'],
+                result['question_type']
+            ) for result in results])
+
+            # Aggregate the user stats deltas so each topic is upserted once
+            topic_deltas = {}
+            for result in results:
+                attempts, correct, score = topic_deltas.get(result['grammar_topic'], (0, 0, 0))
+                topic_deltas[result['grammar_topic']] = (
+                    attempts + 1,
+                    correct + (1 if result['is_correct'] else 0),
+                    score + result['score']
+                )
+
+            cursor.executemany('''
+                INSERT INTO user_stats (grammar_topic, total_attempts, correct_attempts, total_score, last_practiced)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(grammar_topic) DO UPDATE SET
+                    total_attempts = total_attempts + excluded.total_attempts,
+                    correct_attempts = correct_attempts + excluded.correct_attempts,
+                    total_score = total_score + excluded.total_score,
+                    last_practiced = excluded.last_practiced
+            ''', [
+                (topic, attempts, correct, score, now)
+                for topic, (attempts, correct, score) in topic_deltas.items()
+            ])
+
+            cursor.execute(UPDATE_OVERALL_STATS, (
+                sum(attempts for attempts, _, _ in topic_deltas.values()),
+                sum(correct for _, correct, _ in topic_deltas.values()),
+                sum(score or 0 for _, _, score in topic_deltas.values())
+            ))
+
+            cursor.execute('''
+                UPDATE sessions
+                SET total_score = ?, answered_count = ?, correct_count = ?
+                WHERE id = ?
+            ''', (
+                sum(result['score'] for result in results),
+                len(results),
+                sum(1 for result in results if result['is_correct']),
+                session_id
+            ))
+
+            conn.commit()
+        finally:
+            self._release(conn)
 
     def update_user_stats(self, grammar_topic: str, is_correct: bool, score: int):
         """Update aggregated statistics for a grammar topic"""
-        conn = sqlite3.connect(self.db_name, timeout=10.0)
+        conn = self._acquire()
         cursor = conn.cursor()
 
         try:
@@ -152,23 +524,17 @@ class QuizDatabase:
 
             conn.commit()
         finally:
-            conn.close()
+            self._release(conn)
 
     def get_chat_history(self, limit: int = 50) -> List[Dict]:
         """Retrieve chat history from database"""
-        conn = sqlite3.connect(self.db_name)
+        conn = self._acquire()
         cursor = conn.cursor()
 
-        cursor.execute('''
-            SELECT timestamp, grammar_topic, question, user_answer,
-                   correct_answer, is_correct, score, feedback, question_type
-            FROM quiz_history
-            ORDER BY timestamp DESC
-            LIMIT ?
-        ''', (limit,))
+        cursor.execute(CHAT_HISTORY_QUERY, (limit,))
 
         rows = cursor.fetchall()
-        conn.close()
+        self._release(conn)
 
         history = []
         for row in rows:
@@ -188,7 +554,7 @@ class QuizDatabase:
 
     def get_user_stats(self) -> List[Dict]:
         """Get aggregated user statistics"""
-        conn = sqlite3.connect(self.db_name)
+        conn = self._acquire()
         cursor = conn.cursor()
 
         cursor.execute('''
@@ -198,7 +564,7 @@ class QuizDatabase:
         ''')
 
         rows = cursor.fetchall()
-        conn.close()
+        self._release(conn)
 
         stats = []
         for row in rows:
@@ -217,19 +583,14 @@ class QuizDatabase:
 
     def get_overall_stats(self) -> Dict:
         """Get overall statistics"""
-        conn = sqlite3.connect(self.db_name)
+        conn = self._acquire()
         cursor = conn.cursor()
 
-        cursor.execute('SELECT COUNT(*) FROM quiz_history')
-        total_questions = cursor.fetchone()[0]
-
-        cursor.execute('SELECT COUNT(*) FROM quiz_history WHERE is_correct = 1')
-        correct_answers = cursor.fetchone()[0]
+        # Running totals kept up to date by the history writers and deletes
+        cursor.execute('SELECT total_questions, correct_answers, total_score FROM overall_stats WHERE id = 1')
+        total_questions, correct_answers, total_score = cursor.fetchone() or (0, 0, 0)
 
-        cursor.execute('SELECT SUM(score) FROM quiz_history')
-        total_score = cursor.fetchone()[0] or 0
-
-        conn.close()
+        self._release(conn)
 
         avg_score = (total_score / total_questions) if total_questions > 0 else 0
         accuracy = (correct_answers / total_questions * 100) if total_questions > 0 else 0
@@ -242,23 +603,58 @@ class QuizDatabase:
             'accuracy': accuracy
         }
 
+    def rebuild_overall_stats(self) -> bool:
+        """Recompute the overall_stats totals from quiz_history; returns True if they were consistent"""
+        conn = self._acquire()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute('''
+                SELECT COUNT(*), COUNT(CASE WHEN is_correct = 1 THEN 1 END), COALESCE(SUM(score), 0)
+                FROM quiz_history
+            ''')
+            actual = tuple(cursor.fetchone())
+
+            cursor.execute('SELECT total_questions, correct_answers, total_score FROM overall_stats WHERE id = 1')
+            stored = cursor.fetchone()
+
+            cursor.execute('''
+                INSERT OR REPLACE INTO overall_stats (id, total_questions, correct_answers, total_score)
+                VALUES (1, ?, ?, ?)
+            ''', actual)
+
+            conn.commit()
+            return stored is not None and tuple(stored) == actual
+        finally:
+            self._release(conn)
+
     def delete_all_history(self):
         """Clear all quiz history"""
-        conn = sqlite3.connect(self.db_name)
+        conn = self._acquire()
         cursor = conn.cursor()
 
         cursor.execute('DELETE FROM quiz_history')
         cursor.execute('DELETE FROM sessions')
         cursor.execute('DELETE FROM user_stats')
+        cursor.execute('UPDATE overall_stats SET total_questions = 0, correct_answers = 0, total_score = 0')
 
         conn.commit()
-        conn.close()
+        self._release(conn)
 
     def delete_session(self, session_id: int):
         """Delete a specific quiz session and its questions"""
-        conn = sqlite3.connect(self.db_name)
+        conn = self._acquire()
         cursor = conn.cursor()
 
+        # Take this session's answers out of the running totals
+        cursor.execute('''
+            SELECT COUNT(*), COUNT(CASE WHEN is_correct = 1 THEN 1 END), COALESCE(SUM(score), 0)
+            FROM quiz_history
+            WHERE session_id = ?
+        ''', (session_id,))
+        questions, correct, score = cursor.fetchone()
+        cursor.execute(UPDATE_OVERALL_STATS, (-questions, -correct, -score))
+
         # Delete all questions from this session
         cursor.execute('DELETE FROM quiz_history WHERE session_id = ?', (session_id,))
 
@@ -266,11 +662,11 @@ class QuizDatabase:
         cursor.execute('DELETE FROM sessions WHERE id = ?', (session_id,))
 
         conn.commit()
-        conn.close()
+        self._release(conn)
 
     def update_session_score(self, session_id: int, total_score: int):
         """Update the total score for a quiz session"""
-        conn = sqlite3.connect(self.db_name, timeout=10.0)
+        conn = self._acquire()
         cursor = conn.cursor()
 
         try:
@@ -282,25 +678,20 @@ class QuizDatabase:
 
             conn.commit()
         finally:
-            conn.close()
+            self._release(conn)
 
-    def get_quiz_sessions(self, limit: int = 50) -> List[Dict]:
-        """Get all quiz sessions with summary info"""
-        conn = sqlite3.connect(self.db_name)
+    def get_quiz_sessions(self, limit: int = 50, before: Optional[Tuple[str, int]] = None) -> List[Dict]:
+        """Get quiz sessions with summary info, newest first, optionally only those before a (timestamp, session_id) key"""
+        conn = self._acquire()
         cursor = conn.cursor()
 
-        cursor.execute('''
-            SELECT s.id, s.session_start, s.total_questions, s.total_score, s.topics_covered,
-                   COUNT(CASE WHEN h.is_correct = 1 THEN 1 END) as correct_count
-            FROM sessions s
-            LEFT JOIN quiz_history h ON s.id = h.session_id
-            GROUP BY s.id
-            ORDER BY s.session_start DESC
-            LIMIT ?
-        ''', (limit,))
+        if before:
+            cursor.execute(QUIZ_SESSIONS_BEFORE_QUERY, (before[0], before[1], limit))
+        else:
+            cursor.execute(QUIZ_SESSIONS_QUERY, (limit,))
 
         rows = cursor.fetchall()
-        conn.close()
+        self._release(conn)
 
         sessions = []
         for row in rows:
@@ -310,26 +701,21 @@ class QuizDatabase:
                 'total_questions': row[2],
                 'total_score': row[3],
                 'topic': row[4],
-                'correct_count': row[5]
+                'correct_count': row[5],
+                'answered_count': row[6]
             })
 
         return sessions
 
     def get_session_questions(self, session_id: int) -> List[Dict]:
         """Get all questions from a specific quiz session"""
-        conn = sqlite3.connect(self.db_name)
+        conn = self._acquire()
         cursor = conn.cursor()
 
-        cursor.execute('''
-            SELECT timestamp, grammar_topic, question, user_answer,
-                   correct_answer, is_correct, score, feedback, question_type
-            FROM quiz_history
-            WHERE session_id = ?
-            ORDER BY timestamp ASC
-        ''', (session_id,))
+        cursor.execute(SESSION_QUESTIONS_QUERY, (session_id,))
 
         rows = cursor.fetchall()
-        conn.close()
+        self._release(conn)
 
         questions = []
         for row in rows:
@@ -347,22 +733,51 @@ class QuizDatabase:
 
         return questions
 
+    def get_questions_for_sessions(self, session_ids: List[int]) -> Dict[int, List[Dict]]:
+        """Get the questions of several sessions with a single query, grouped by session_id"""
+        questions = {session_id: [] for session_id in session_ids}
+        if not session_ids:
+            return questions
+
+        conn = self._acquire()
+        cursor = conn.cursor()
+
+        placeholders = ', '.join('?' for _ in session_ids)
+        cursor.execute(f'''
+            SELECT session_id, timestamp, grammar_topic, question, user_answer,
+                   correct_answer, is_correct, score, feedback, question_type
+            FROM quiz_history
+            WHERE session_id IN ({placeholders})
+            ORDER BY session_id, timestamp ASC, id ASC
+        ''', list(session_ids))
+
+        rows = cursor.fetchall()
+        self._release(conn)
+
+        for row in rows:
+            questions[row[0]].append({
+                'timestamp': row[1],
+                'grammar_topic': row[2],
+                'question': row[3],
+                'user_answer': row[4],
+                'correct_answer': row[5],
+                'is_correct': row[6],
+                'score': row[7],
+                'feedback': row[8],
+                'question_type': row[9]
+            })
+
+        return questions
+
     def get_topic_history(self, topic: str, limit: int = 20) -> List[Dict]:
         """Get history for a specific topic"""
-        conn = sqlite3.connect(self.db_name)
+        conn = self._acquire()
         cursor = conn.cursor()
 
-        cursor.execute('''
-            SELECT timestamp, question, user_answer, correct_answer,
-                   is_correct, score, feedback, question_type
-            FROM quiz_history
-            WHERE grammar_topic = ?
-            ORDER BY timestamp DESC
-            LIMIT ?
-        ''', (topic, limit))
+        cursor.execute(TOPIC_HISTORY_QUERY, (topic, limit))
 
         rows = cursor.fetchall()
-        conn.close()
+        self._release(conn)
 
         history = []
         for row in rows:
@@ -378,3 +793,342 @@ class QuizDatabase:
             })
 
         return history
+
+    def add_bank_questions(self, grammar_topic: str, question_type: str, difficulty: str,
+                           questions: List[Dict], served: bool = False) -> int:
+        """Store generated questions in the bank (as served if the learner has seen them); returns how many were new"""
+        conn = self._acquire()
+        cursor = conn.cursor()
+
+        try:
+            now = datetime.now().isoformat()
+            added = 0
+            for question_data in questions:
+                question = str(question_data.get('question', '')).strip()
+                if not question:
+                    continue
+                cursor.execute('''
+                    INSERT OR IGNORE INTO question_bank
+                    (grammar_topic, question_type, difficulty, question, question_data, created_at,
+                     times_served, last_served)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (
+                    grammar_topic,
+                    question_type,
+                    difficulty,
+                    question,
+                    json.dumps(question_data),
+                    now,
+                    1 if served else 0,
+                    now if served else None
+                ))
+                added += cursor.rowcount
+
+            conn.commit()
+            return added
+        finally:
+            self._release(conn)
+
+    def get_bank_questions(self, grammar_topic: str, question_type: str, difficulty: str,
+                           count: int = 10) -> List[Dict]:
+        """Draw up to count never-served questions from the bank, marking them served"""
+        conn = self._acquire()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute('''
+                SELECT id, question_data
+                FROM question_bank
+                WHERE grammar_topic = ? AND question_type = ? AND difficulty = ? AND times_served = 0
+                ORDER BY RANDOM()
+                LIMIT ?
+            ''', (grammar_topic, question_type, difficulty, count))
+
+            rows = cursor.fetchall()
+
+            # Mark drawn questions as served so no later quiz repeats them
+            cursor.executemany('''
+                UPDATE question_bank
+                SET times_served = times_served + 1, last_served = ?
+                WHERE id = ?
+            ''', [(datetime.now().isoformat(), row[0]) for row in rows])
+
+            conn.commit()
+        finally:
+            self._release(conn)
+
+        return [json.loads(row[1]) for row in rows]
+
+    def count_bank_questions(self, grammar_topic: str, question_type: str, difficulty: str) -> int:
+        """Count never-served banked questions for a topic/type/difficulty combination"""
+        conn = self._acquire()
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            SELECT COUNT(*) FROM question_bank
+            WHERE grammar_topic = ? AND question_type = ? AND difficulty = ? AND times_served = 0
+        ''', (grammar_topic, question_type, difficulty))
+
+        count = cursor.fetchone()[0]
+        self._release(conn)
+
+        return count
+
+    def get_questions_since(self, history_id: int = 0, bank_id: int = 0) -> Tuple[List[Tuple[str, str]], int, int]:
+        """(topic, question) pairs added to history or the bank after the given ids, plus the new last ids"""
+        conn = self._acquire()
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            SELECT id, grammar_topic, question FROM quiz_history
+            WHERE id > ? ORDER BY id
+        ''', (history_id,))
+        history_rows = cursor.fetchall()
+
+        cursor.execute('''
+            SELECT id, grammar_topic, question FROM question_bank
+            WHERE id > ? ORDER BY id
+        ''', (bank_id,))
+        bank_rows = cursor.fetchall()
+        self._release(conn)
+
+        rows = [(row[1], row[2]) for row in history_rows + bank_rows]
+        if history_rows:
+            history_id = history_rows[-1][0]
+        if bank_rows:
+            bank_id = bank_rows[-1][0]
+        return rows, history_id, bank_id
+
+    def get_cached_evaluation(self, cache_key: str, ttl: float = EVALUATION_CACHE_TTL) -> Optional[Dict]:
+        """Return a cached evaluation younger than ttl seconds, marking it as recently used"""
+        conn = self._acquire()
+        cursor = conn.cursor()
+
+        try:
+            now = datetime.now()
+            cursor.execute('''
+                SELECT evaluation FROM evaluation_cache
+                WHERE cache_key = ? AND created_at >= ?
+            ''', (cache_key, (now - timedelta(seconds=ttl)).isoformat()))
+
+            row = cursor.fetchone()
+            if row is None:
+                return None
+
+            cursor.execute('''
+                UPDATE evaluation_cache SET hits = hits + 1, last_used = ?
+                WHERE cache_key = ?
+            ''', (now.isoformat(), cache_key))
+            conn.commit()
+        finally:
+            self._release(conn)
+
+        return json.loads(row[0])
+
+    def store_cached_evaluation(self, cache_key: str, evaluation: Dict,
+                                max_entries: int = EVALUATION_CACHE_MAX_ENTRIES,
+                                ttl: float = EVALUATION_CACHE_TTL):
+        """Cache an evaluation, then evict expired entries and the least recently used over the cap"""
+        conn = self._acquire()
+        cursor = conn.cursor()
+
+        try:
+            now = datetime.now()
+            cursor.execute('''
+                INSERT OR REPLACE INTO evaluation_cache (cache_key, evaluation, created_at, last_used)
+                VALUES (?, ?, ?, ?)
+            ''', (
+                cache_key,
+                json.dumps({
+                    'is_correct': evaluation.get('is_correct'),
+                    'score': evaluation.get('score'),
+                    'feedback': evaluation.get('feedback'),
+                    **({'extracted_answer': evaluation['extracted_answer']} if 'extracted_answer' in evaluation else {})
+                }),
+                now.isoformat(),
+                now.isoformat()
+            ))
+
+            cursor.execute('DELETE FROM evaluation_cache WHERE created_at < ?',
+                           ((now - timedelta(seconds=ttl)).isoformat(),))
+            cursor.execute('''
+                DELETE FROM evaluation_cache WHERE cache_key IN (
+                    SELECT cache_key FROM evaluation_cache
+                    ORDER BY last_used DESC
+                    LIMIT -1 OFFSET ?
+                )
+            ''', (max_entries,))
+
+            conn.commit()
+        finally:
+            self._release(conn)
+
+    def get_evaluation_cache_stats(self) -> Dict:
+        """Summarize the evaluation cache: entries stored and evaluations it has answered"""
+        conn = self._acquire()
+        cursor = conn.cursor()
+
+        cursor.execute('SELECT COUNT(*), COALESCE(SUM(hits), 0) FROM evaluation_cache')
+        entries, hits = cursor.fetchone()
+        self._release(conn)
+
+        return {'entries': entries, 'hits': hits}
+
+    def record_llm_calls(self, calls: List[Dict], max_rows: int = LLM_CALLS_MAX_ROWS):
+        """Store a batch of LLM call records and add them to the running totals, dropping the oldest rows over the cap"""
+        if not calls:
+            return
+
+        conn = self._acquire()
+        cursor = conn.cursor()
+
+        try:
+            cursor.executemany('''
+                INSERT INTO llm_calls
+                (timestamp, call_site, question_type, difficulty, outcome, cache_hit,
+                 latency_ms, prompt_tokens, response_tokens)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [(
+                call['timestamp'],
+                call['call_site'],
+                call.get('question_type'),
+                call.get('difficulty'),
+                call['outcome'],
+                1 if call.get('cache_hit') else 0,
+                call['latency_ms'],
+                call.get('prompt_tokens'),
+                call.get('response_tokens')
+            ) for call in calls])
+
+            cursor.executemany(UPDATE_LLM_CALL_TOTALS, [(
+                call['call_site'],
+                call.get('question_type') or '',
+                call.get('difficulty') or '',
+                1 if call.get('cache_hit') else 0,
+                1 if call['outcome'] == 'ok' else 0,
+                1 if call['outcome'] == 'parse_fail' else 0,
+                1 if call['outcome'] == 'quota' else 0,
+                1 if call['outcome'] == 'timeout' else 0,
+                0.0 if call.get('cache_hit') else call['latency_ms'],
+                0 if call.get('cache_hit') else 1,
+                call.get('prompt_tokens') or 0,
+                0 if call.get('prompt_tokens') is None else 1,
+                call.get('response_tokens') or 0,
+                0 if call.get('response_tokens') is None else 1
+            ) for call in calls])
+
+            # Ids only grow, so everything at or below the newest id - max_rows is older than the cap
+            cursor.execute('SELECT MAX(id) FROM llm_calls')
+            cursor.execute('DELETE FROM llm_calls WHERE id <= ?', (cursor.fetchone()[0] - max_rows,))
+
+            conn.commit()
+        finally:
+            self._release(conn)
+
+    def get_llm_call_summary(self) -> List[Dict]:
+        """Call counts by outcome, cache hits, latency and token use per call site, question type and difficulty"""
+        conn = self._acquire()
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            SELECT call_site, question_type, difficulty, calls, cache_hits, ok, parse_fail, quota, timeout,
+                   latency_ms, timed_calls, prompt_tokens, prompt_metered, response_tokens, response_metered
+            FROM llm_call_totals
+            ORDER BY call_site, question_type, difficulty
+        ''')
+
+        rows = cursor.fetchall()
+        self._release(conn)
+
+        return [{
+            'call_site': row[0],
+            'question_type': row[1] or None,
+            'difficulty': row[2] or None,
+            'calls': row[3],
+            'cache_hits': row[4],
+            'ok': row[5],
+            'parse_fail': row[6],
+            'quota': row[7],
+            'timeout': row[8],
+            'errors': row[3] - row[5] - row[6] - row[7] - row[8],
+            'avg_latency_ms': row[9] / row[10] if row[10] else None,
+            'avg_prompt_tokens': row[11] / row[12] if row[12] else None,
+            'avg_response_tokens': row[13] / row[14] if row[14] else None,
+            'total_tokens': row[11] + row[13]
+        } for row in rows]
+
+    @staticmethod
+    def _refill(limits: Dict[str, Tuple[float, float]], rows: Dict[str, Tuple[float, float]],
+                now: float) -> Dict[str, float]:
+        """Current token level of each bucket, given its (capacity, period in seconds)"""
+        levels = {}
+        for name, (capacity, period) in limits.items():
+            tokens, updated_at = rows.get(name, (capacity, now))
+            levels[name] = min(capacity, tokens + max(0.0, now - updated_at) * capacity / period)
+        return levels
+
+    def acquire_rate_tokens(self, limits: Dict[str, Tuple[float, float]],
+                            reserve: Optional[Dict[str, float]] = None) -> float:
+        """Take a token from every bucket atomically, or return the seconds until one above reserve is free"""
+        reserve = reserve or {}
+        conn = self._acquire()
+
+        try:
+            # IMMEDIATE takes the write lock up front so two processes cannot spend the same token
+            conn.execute('BEGIN IMMEDIATE')
+            now = time.time()
+            rows = {
+                name: (tokens, updated_at)
+                for name, tokens, updated_at in conn.execute(
+                    'SELECT name, tokens, updated_at FROM rate_limit_buckets'
+                )
+            }
+            levels = self._refill(limits, rows, now)
+
+            wait = 0.0
+            for name, (capacity, period) in limits.items():
+                needed = 1 + reserve.get(name, 0)
+                if levels[name] < needed:
+                    wait = max(wait, (needed - levels[name]) * period / capacity)
+
+            if wait == 0:
+                levels = {name: level - 1 for name, level in levels.items()}
+
+            conn.executemany('''
+                INSERT INTO rate_limit_buckets (name, tokens, updated_at)
+                VALUES (?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET
+                    tokens = excluded.tokens,
+                    updated_at = excluded.updated_at
+            ''', [(name, level, now) for name, level in levels.items()])
+            conn.commit()
+            return wait
+        finally:
+            self._release(conn)
+
+    def get_rate_limit_levels(self, limits: Dict[str, Tuple[float, float]]) -> Dict[str, float]:
+        """Tokens currently left in each rate limit bucket"""
+        conn = self._acquire()
+        cursor = conn.cursor()
+
+        cursor.execute('SELECT name, tokens, updated_at FROM rate_limit_buckets')
+        rows = {name: (tokens, updated_at) for name, tokens, updated_at in cursor.fetchall()}
+        self._release(conn)
+
+        return self._refill(limits, rows, time.time())
+
+if __name__ == "__main__":
+    # Check that the history and session queries still use their indexes,
+    # and that the running totals match the history they summarize
+    import sys
+
+    db = QuizDatabase()
+    regressions = db.check_query_plans()
+    for name, plan in regressions.items():
+        print(f"{name}: {' | '.join(plan)}")
+    print("Query plans OK" if not regressions else f"{len(regressions)} query plan regression(s)")
+
+    consistent = db.rebuild_overall_stats()
+    print("Overall stats OK" if consistent else "Overall stats were inconsistent and have been rebuilt")
+
+    sys.exit(0 if not regressions and consistent else 1)
@@ -0,0 +1,270 @@
+import hashlib
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+FULL_SCORE = 10
+
+# (accept, reject) similarity thresholds for the fuzzy graded types. Answers at or
+# above accept are graded correct locally, answers below reject are graded wrong
+# locally, and everything in between is escalated to the LLM.
+FUZZY_THRESHOLDS = {
+    "Fill in the Blanks": (1.0, 0.5)
+}
+
+# Only an exact match is graded locally: capitalization or end punctuation can be the correction
+SENTENCE_CORRECTION = "Sentence Correction"
+
+_OPTION_PREFIX = re.compile(r'^\(?([a-d])[\).:]\s+', re.IGNORECASE)
+_TRUE_VALUES = {"true", "t", "yes", "correct"}
+_FALSE_VALUES = {"false", "f", "no", "incorrect"}
+
+_CONTRACTIONS = [
+    (re.compile(r"\bcan't\b"), "can not"),
+    (re.compile(r"\bcannot\b"), "can not"),
+    (re.compile(r"\bwon't\b"), "will not"),
+    (re.compile(r"\bshan't\b"), "shall not"),
+    (re.compile(r"n't\b"), " not"),
+    (re.compile(r"'re\b"), " are"),
+    (re.compile(r"\bi'm\b"), "i am"),
+    (re.compile(r"'ll\b"), " will"),
+    (re.compile(r"'ve\b"), " have"),
+    (re.compile(r"'d\b"), " would")
+]
+_BLANK = re.compile(r'_{2,}|\.{3,}|\[blank\]', re.IGNORECASE)
+_PUNCTUATION = re.compile(r"[^\w\s']")
+_INNER_PUNCTUATION = re.compile(r"[,;:\-\u2013\u2014()\"]")
+
+_stats_lock = threading.Lock()
+_stats = {'graded_locally': 0, 'escalated': 0}
+
+
+def normalize_answer(text) -> str:
+    """Normalize an answer for comparison (case, whitespace, surrounding punctuation)"""
+    if text is None:
+        return ""
+    text = " ".join(str(text).split()).casefold()
+    return text.strip(" .,!?;:'\"")
+
+
+def evaluation_cache_key(question_data: Dict, user_answer: str) -> str:
+    """Hash of the (question, correct answer, user answer) triple"""
+    # Case and punctuation in the answer may be exactly what is graded, so only its spacing is normalized
+    triple = [
+        normalize_answer(question_data.get('question')),
+        normalize_answer(question_data.get('correct_answer')),
+        " ".join(str(user_answer or '').split())
+    ]
+    return hashlib.sha256("\x1f".join(triple).encode('utf-8')).hexdigest()
+
+
+def _strip_option_prefix(text: str) -> str:
+    """Remove a leading option label such as 'A)' or '(b)'"""
+    return _OPTION_PREFIX.sub('', text)
+
+
+def _option_text(text) -> str:
+    """Option text as compared for matching (case, spacing and labels ignored)"""
+    return normalize_answer(_strip_option_prefix(normalize_answer(text)))
+
+
+def _resolve_option_letter(answer: str, options: List[str]) -> str:
+    """Map a bare option letter ('B') to the option text it refers to, unless it is itself an option ('a')"""
+    if any(_option_text(option) == _option_text(answer) for option in options):
+        return answer
+    letter = answer.strip().strip("().").lower()
+    if len(letter) == 1 and 'a' <= letter <= 'd':
+        index = ord(letter) - ord('a')
+        if index < len(options):
+            return options[index]
+    return answer
+
+
+def normalize_bool(text) -> Optional[bool]:
+    """Interpret a True/False answer, returning None if it is neither"""
+    value = normalize_answer(text)
+    if value in _TRUE_VALUES:
+        return True
+    if value in _FALSE_VALUES:
+        return False
+    return None
+
+
+def match_option(answer, options: List[str]) -> Optional[str]:
+    """Return the option an answer refers to (by text, ignoring case and labels, or by letter)"""
+    target = _option_text(_resolve_option_letter(str(answer or ''), options))
+    for option in options:
+        if _option_text(option) == target:
+            return option
+    return None
+
+
+def _build_feedback(question_data: Dict, is_correct: bool, correct_answer: str) -> str:
+    """Build feedback from the explanation stored with the question"""
+    explanation = (question_data.get('explanation') or '').strip()
+    if is_correct:
+        feedback = "Correct! Well done."
+    else:
+        feedback = f"Incorrect. The correct answer is: {correct_answer.rstrip('.')}."
+    if explanation:
+        feedback = f"{feedback} {explanation}"
+    return feedback
+
+
+def grade_mcq(question_data: Dict, user_answer: str) -> Dict:
+    """Grade a multiple choice answer against the stored correct answer"""
+    options = question_data.get('options') or []
+    correct = _resolve_option_letter(str(question_data.get('correct_answer', '')), options)
+
+    expected = _option_text(correct)
+    given = _option_text(user_answer)
+    is_correct = bool(given) and given == expected
+
+    return {
+        'is_correct': is_correct,
+        'score': FULL_SCORE if is_correct else 0,
+        'feedback': _build_feedback(question_data, is_correct, correct)
+    }
+
+
+def grade_true_false(question_data: Dict, user_answer: str) -> Dict:
+    """Grade a True/False answer against the stored correct answer"""
+    expected = normalize_bool(question_data.get('correct_answer'))
+    given = normalize_bool(user_answer)
+    is_correct = given is not None and given == expected
+
+    return {
+        'is_correct': is_correct,
+        'score': FULL_SCORE if is_correct else 0,
+        'feedback': _build_feedback(question_data, is_correct, str(question_data.get('correct_answer', '')))
+    }
+
+
+def _tokenize(text) -> List[str]:
+    """Split an answer into comparable word tokens (contractions expanded, punctuation dropped)"""
+    text = str(text or '').replace('\u2019', "'").replace('\u2018', "'").casefold()
+    for pattern, replacement in _CONTRACTIONS:
+        text = pattern.sub(replacement, text)
+    text = _PUNCTUATION.sub(' ', text)
+    return [token.strip("'") for token in text.split() if token.strip("'")]
+
+
+def _punctuation_signature(text) -> str:
+    """Punctuation inside the sentence, which can be the point of a correction"""
+    return "".join(_INNER_PUNCTUATION.findall(str(text or '')))
+
+
+def token_edit_distance(a: List[str], b: List[str]) -> int:
+    """Levenshtein distance between two token lists"""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, token_a in enumerate(a, 1):
+        current = [i]
+        for j, token_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (token_a != token_b)
+            ))
+        previous = current
+    return previous[-1]
+
+
+def token_similarity(a: List[str], b: List[str]) -> float:
+    """Similarity in [0, 1] derived from the token edit distance"""
+    longest = max(len(a), len(b))
+    if longest == 0:
+        return 1.0
+    return 1.0 - token_edit_distance(a, b) / longest
+
+
+def _reference_answers(question_data: Dict) -> List[str]:
+    """Answers to compare against, including the question with its blank filled in"""
+    correct = str(question_data.get('correct_answer', ''))
+    references = [correct]
+    question = str(question_data.get('question', ''))
+    if question_data.get('type') == "Fill in the Blanks" and _BLANK.search(question):
+        references.append(_BLANK.sub(correct, question, count=1))
+    return references
+
+
+def grade_fuzzy(question_data: Dict, user_answer: str,
+                thresholds: Optional[Tuple[float, float]] = None) -> Optional[Dict]:
+    """Grade a free-text answer by token similarity, returning None if it is ambiguous"""
+    accept, reject = thresholds or FUZZY_THRESHOLDS[question_data.get('type')]
+    given = _tokenize(user_answer)
+    if not given:
+        return None
+
+    best_similarity = 0.0
+    best_reference = ''
+    for reference in _reference_answers(question_data):
+        similarity = token_similarity(given, _tokenize(reference))
+        if similarity > best_similarity:
+            best_similarity, best_reference = similarity, reference
+
+    if best_similarity >= accept:
+        # Same words but different commas/semicolons may be exactly what is being tested
+        if _punctuation_signature(user_answer) != _punctuation_signature(best_reference):
+            return None
+        is_correct = True
+    elif best_similarity < reject:
+        is_correct = False
+    else:
+        return None
+
+    return {
+        'is_correct': is_correct,
+        'score': FULL_SCORE if is_correct else 0,
+        'feedback': _build_feedback(question_data, is_correct, str(question_data.get('correct_answer', '')))
+    }
+
+
+def grade_sentence_correction(question_data: Dict, user_answer: str) -> Optional[Dict]:
+    """Accept an exact (case- and punctuation-sensitive) corrected sentence, returning None otherwise"""
+    correct = " ".join(str(question_data.get('correct_answer', '')).split())
+    if not correct or " ".join(str(user_answer or '').split()) != correct:
+        return None
+
+    return {
+        'is_correct': True,
+        'score': FULL_SCORE,
+        'feedback': _build_feedback(question_data, True, correct)
+    }
+
+
+def _record(graded_locally: bool):
+    """Count a local grade (an LLM call avoided) or an escalation"""
+    with _stats_lock:
+        _stats['graded_locally' if graded_locally else 'escalated'] += 1
+
+
+def get_grading_stats() -> Dict:
+    """Return how many evaluations were graded locally instead of by the LLM"""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['calls_avoided'] = stats['graded_locally']
+    return stats
+
+
+def grade_locally(question_data: Dict, user_answer: str) -> Optional[Dict]:
+    """Grade an answer in-process, returning None if the answer needs the LLM"""
+    question_type = question_data.get('type')
+    evaluation = None
+
+    if question_type == "Multiple Choice (MCQ)":
+        evaluation = grade_mcq(question_data, user_answer)
+    elif question_type == "True/False":
+        # Fall back to the LLM if the stored answer is not a plain True/False
+        if normalize_bool(question_data.get('correct_answer')) is not None:
+            evaluation = grade_true_false(question_data, user_answer)
+    elif question_type == SENTENCE_CORRECTION:
+        evaluation = grade_sentence_correction(question_data, user_answer)
+    elif question_type in FUZZY_THRESHOLDS:
+        evaluation = grade_fuzzy(question_data, user_answer)
+    else:
+        return None
+
+    _record(evaluation is not None)
+    return evaluation
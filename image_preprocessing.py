@@ -0,0 +1,81 @@
+import hashlib
+import io
+import threading
+import time
+from typing import Dict, Tuple
+
+from PIL import Image, ImageOps
+
+# Handwritten answers stay legible well below phone camera resolution
+MAX_SIDE = 1024
+IMAGE_FORMAT = "JPEG"
+IMAGE_QUALITY = 75
+
+MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+
+_stats_lock = threading.Lock()
+_stats = {
+    'images': 0,
+    'duplicates': 0,
+    'original_bytes': 0,
+    'sent_bytes': 0,
+    'preprocess_seconds': 0.0,
+    'requests': 0,
+    'request_seconds': 0.0
+}
+
+
+def preprocess_image(source, max_side: int = MAX_SIDE, image_format: str = IMAGE_FORMAT,
+                     quality: int = IMAGE_QUALITY) -> Tuple[Dict, str, Dict]:
+    """Shrink an answer photo for upload, returning the blob to send, a SHA-256 of the uploaded bytes and a size report"""
+    started = time.perf_counter()
+    original = source.getvalue() if hasattr(source, 'getvalue') else source.read()
+
+    image = Image.open(io.BytesIO(original))
+    # Phone photos are often stored sideways with an EXIF rotation flag
+    image = ImageOps.exif_transpose(image)
+    image = ImageOps.autocontrast(image.convert("L"), cutoff=1)
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, quality=quality, optimize=True)
+    data = buffer.getvalue()
+
+    report = {
+        'original_bytes': len(original),
+        'sent_bytes': len(data),
+        'size': image.size,
+        'preprocess_seconds': time.perf_counter() - started
+    }
+    with _stats_lock:
+        _stats['images'] += 1
+        _stats['original_bytes'] += report['original_bytes']
+        _stats['sent_bytes'] += report['sent_bytes']
+        _stats['preprocess_seconds'] += report['preprocess_seconds']
+
+    blob = {'mime_type': MIME_TYPES[image_format.upper()], 'data': data}
+    # An exact hash: a thumbnail hash of handwriting on paper is decided by the lighting, not the writing
+    return blob, hashlib.sha256(original).hexdigest(), report
+
+
+def record_duplicate():
+    """Count a re-upload answered from a prior evaluation"""
+    with _stats_lock:
+        _stats['duplicates'] += 1
+
+
+def record_request(seconds: float):
+    """Count the latency of an image evaluation request"""
+    with _stats_lock:
+        _stats['requests'] += 1
+        _stats['request_seconds'] += seconds
+
+
+def get_image_stats() -> Dict:
+    """Return upload size and latency totals, with averages, since the app was started"""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['bytes_saved'] = stats['original_bytes'] - stats['sent_bytes']
+    stats['avg_preprocess_ms'] = stats['preprocess_seconds'] * 1000 / stats['images'] if stats['images'] else 0.0
+    stats['avg_request_seconds'] = stats['request_seconds'] / stats['requests'] if stats['requests'] else 0.0
+    return stats
@@ -0,0 +1,223 @@
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from typing import Dict, Iterator, Optional, Tuple
+
+from model_client import DEFAULT_MODEL, RESPONSE_SCHEMAS, get_model
+
+# Request kinds, matching the structured output schemas in model_client
+QUESTIONS = "questions"
+EVALUATION = "evaluation"
+IMAGE_EVALUATION = "image_evaluation"
+EVALUATIONS = "evaluations"
+
+STREAM_CHUNK_SIZE = 200
+
+
+class LLMResponse:
+    """Text of a model reply, with token counts when the backend reports them"""
+
+    def __init__(self, text: str, prompt_tokens: Optional[int] = None, response_tokens: Optional[int] = None):
+        self.text = text
+        self.prompt_tokens = prompt_tokens
+        self.response_tokens = response_tokens
+
+
+class LLMBackend:
+    """Interface the app uses to generate questions and evaluate answers; kind selects the request type"""
+
+    name = "base"
+
+    def complete(self, kind: str, contents, timeout: float) -> LLMResponse:
+        """Send one request of the given kind and return the whole reply"""
+        raise NotImplementedError
+
+    def stream(self, kind: str, contents, timeout: float) -> Iterator[str]:
+        """Send one request and yield the reply text as it arrives"""
+        yield self.complete(kind, contents, timeout).text
+
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini through the shared model clients"""
+
+    name = "gemini"
+
+    def __init__(self, model_name: str = DEFAULT_MODEL, structured: bool = True):
+        self.model_name = model_name
+        self.structured = structured
+
+    def _model(self, kind: str):
+        return get_model(self.model_name, kind if self.structured and kind in RESPONSE_SCHEMAS else None)
+
+    def complete(self, kind: str, contents, timeout: float) -> LLMResponse:
+        response = self._model(kind).generate_content(contents, request_options={'timeout': timeout})
+        usage = getattr(response, 'usage_metadata', None)
+        return LLMResponse(
+            response.text,
+            getattr(usage, 'prompt_token_count', None),
+            getattr(usage, 'candidates_token_count', None)
+        )
+
+    def stream(self, kind: str, contents, timeout: float) -> Iterator[str]:
+        response = self._model(kind).generate_content(contents, stream=True, request_options={'timeout': timeout})
+        for chunk in response:
+            yield chunk.text
+
+
+class ServiceUnavailable(Exception):
+    """Injected stand-in for a 503 from the API"""
+
+
+class ResourceExhausted(Exception):
+    """Injected stand-in for a 429 quota error from the API"""
+
+
+class CassetteMiss(LookupError):
+    """Raised when a replay cassette has no response for a request kind"""
+
+
+def request_key(kind: str, contents) -> str:
+    """Stable hash of a request, with image blobs hashed by their bytes"""
+    parts = contents if isinstance(contents, list) else [contents]
+    digest = hashlib.sha256(kind.encode('utf-8'))
+    for part in parts:
+        if isinstance(part, dict) and 'data' in part:
+            digest.update(hashlib.sha256(part['data']).digest())
+        else:
+            digest.update(str(part).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class ReplayBackend(LLMBackend):
+    """Replays recorded responses from a cassette file, with configurable latency and injected errors"""
+
+    name = "replay"
+
+    def __init__(self, cassette_path: Optional[str] = None, latency: Tuple[float, float] = (0.0, 0.0),
+                 errors: Optional[Dict[str, float]] = None, record_from: Optional[LLMBackend] = None,
+                 seed: Optional[int] = None):
+        self.cassette_path = cassette_path
+        self.latency = latency
+        self.errors = errors or {}
+        self.record_from = record_from
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._turns: Dict[str, int] = {}
+        self._cassette = {'requests': {}, 'by_kind': {}}
+        if cassette_path and os.path.exists(cassette_path):
+            with open(cassette_path, encoding='utf-8') as f:
+                self._cassette = json.load(f)
+
+    def _save(self):
+        if not self.cassette_path:
+            return
+        temp_path = f"{self.cassette_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._cassette, f, indent=2)
+        os.replace(temp_path, self.cassette_path)
+
+    def _inject(self, timeout: float):
+        """Sleep for the configured latency, then raise an injected error if one is drawn"""
+        with self._lock:
+            delay = self._random.uniform(*self.latency)
+            draw = self._random.random()
+        time.sleep(min(delay, timeout))
+        if delay > timeout:
+            raise TimeoutError(f"Replay latency {delay:.1f}s exceeded the {timeout:.1f}s timeout")
+
+        threshold = 0.0
+        for error, rate in self.errors.items():
+            threshold += rate
+            if draw < threshold:
+                if error == 'quota':
+                    raise ResourceExhausted("429 Resource has been exhausted (check quota) [injected]")
+                if error == 'timeout':
+                    time.sleep(timeout)
+                    raise TimeoutError("Request timed out [injected]")
+                raise ServiceUnavailable("503 The service is currently unavailable [injected]")
+
+    def _lookup(self, kind: str, key: str) -> Optional[Dict]:
+        # Prompts change as history grows, so unrecorded ones get this kind's recordings in turn
+        with self._lock:
+            entry = self._cassette['requests'].get(key)
+            if entry is not None:
+                return entry
+            keys = self._cassette['by_kind'].get(kind)
+            if not keys:
+                return None
+            turn = self._turns.get(kind, 0)
+            self._turns[kind] = turn + 1
+            return self._cassette['requests'][keys[turn % len(keys)]]
+
+    def record(self, kind: str, contents, response: LLMResponse):
+        """Add a response to the cassette (and its file, if it has one)"""
+        key = request_key(kind, contents)
+        with self._lock:
+            self._cassette['requests'][key] = {
+                'kind': kind,
+                'text': response.text,
+                'prompt_tokens': response.prompt_tokens,
+                'response_tokens': response.response_tokens
+            }
+            self._cassette['by_kind'].setdefault(kind, []).append(key)
+            self._save()
+
+    def complete(self, kind: str, contents, timeout: float) -> LLMResponse:
+        key = request_key(kind, contents)
+        if self.record_from is not None:
+            # Record mode: pass requests missing from the cassette through and save the replies
+            with self._lock:
+                recorded = self._cassette['requests'].get(key)
+            if recorded is None:
+                response = self.record_from.complete(kind, contents, timeout)
+                self.record(kind, contents, response)
+                return response
+
+        entry = self._lookup(kind, key)
+        if entry is None:
+            raise CassetteMiss(f"No recorded '{kind}' responses in {self.cassette_path}")
+        self._inject(timeout)
+        return LLMResponse(entry['text'], entry.get('prompt_tokens'), entry.get('response_tokens'))
+
+    def stream(self, kind: str, contents, timeout: float) -> Iterator[str]:
+        text = self.complete(kind, contents, timeout).text
+        for start in range(0, len(text), STREAM_CHUNK_SIZE):
+            yield text[start:start + STREAM_CHUNK_SIZE]
+
+
+def _parse_latency(value: str) -> Tuple[float, float]:
+    """'0.5' for a fixed delay or '0.2,1.5' for a uniform range, in seconds"""
+    bounds = [float(part) for part in value.split(',') if part.strip()] or [0.0]
+    return (bounds[0], bounds[-1])
+
+
+def _parse_errors(value: str) -> Dict[str, float]:
+    """'server=0.05,timeout=0.01,quota=0' as injected error rates"""
+    errors = {}
+    for item in value.split(','):
+        if '=' in item:
+            error, rate = item.split('=', 1)
+            errors[error.strip()] = float(rate)
+    return errors
+
+
+def backend_from_env(model_name: str = DEFAULT_MODEL, structured: bool = True) -> LLMBackend:
+    """Backend chosen by LLM_BACKEND: gemini (default), record or replay"""
+    name = os.getenv("LLM_BACKEND", "gemini").lower()
+    gemini = GeminiBackend(model_name, structured)
+    if name == "gemini":
+        return gemini
+
+    cassette = os.getenv("LLM_CASSETTE", "llm_cassette.json")
+    if name == "record":
+        return ReplayBackend(cassette, record_from=gemini)
+    if name == "replay":
+        return ReplayBackend(
+            cassette,
+            _parse_latency(os.getenv("LLM_REPLAY_LATENCY", "0")),
+            _parse_errors(os.getenv("LLM_INJECT_ERRORS", ""))
+        )
+    raise ValueError(f"Unknown LLM_BACKEND '{name}' (expected gemini, record or replay)")
@@ -0,0 +1,301 @@
+import os
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+from resilience import is_quota_error
+
+# Call outcomes
+OK = "ok"
+PARSE_FAIL = "parse_fail"
+QUOTA = "quota"
+TIMEOUT = "timeout"
+ERROR = "error"
+OUTCOMES = (OK, PARSE_FAIL, QUOTA, TIMEOUT, ERROR)
+
+# Call sites
+GENERATE_QUESTIONS = "generate_questions"
+STREAM_QUESTIONS = "stream_questions"
+EVALUATE_ANSWER = "evaluate_answer"
+EVALUATE_IMAGE_ANSWER = "evaluate_image_answer"
+EVALUATE_ANSWERS = "evaluate_answers"
+
+# Recent calls kept in memory, and latency histogram buckets (seconds) for the Prometheus export
+RING_SIZE = 500
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Seconds between rewrites of the Prometheus export file, and most call records written per transaction
+PROMETHEUS_WRITE_INTERVAL = 5.0
+WRITE_BATCH_SIZE = 200
+
+
+def classify_error(error: Exception) -> str:
+    """Outcome for a call that raised"""
+    if is_quota_error(error):
+        return QUOTA
+    # The response parser raises ValueError (incl. JSONDecodeError) when nothing can be recovered
+    if isinstance(error, ValueError):
+        return PARSE_FAIL
+    name = type(error).__name__
+    if isinstance(error, TimeoutError) or "Timeout" in name or "DeadlineExceeded" in name:
+        return TIMEOUT
+    return ERROR
+
+
+def _percentile(samples: List[float], percentile: float) -> Optional[float]:
+    if not samples:
+        return None
+    return samples[min(len(samples) - 1, int(len(samples) * percentile / 100))]
+
+
+def _label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class LLMCall:
+    """One tracked call; the code inside LLMMetrics.track() reports tokens, cache hits and failures on it"""
+
+    def __init__(self, call_site: str, question_type: Optional[str] = None, difficulty: Optional[str] = None):
+        self.call_site = call_site
+        self.question_type = question_type
+        self.difficulty = difficulty
+        self.outcome = OK
+        self.cache_hit = False
+        self.prompt_tokens = None
+        self.response_tokens = None
+
+    def set_response(self, response):
+        """Take the token counts from an LLMResponse"""
+        self.prompt_tokens = response.prompt_tokens
+        self.response_tokens = response.response_tokens
+
+    def mark_cache_hit(self):
+        self.cache_hit = True
+
+    def mark_parse_failure(self):
+        self.outcome = PARSE_FAIL
+
+    def mark_error(self, error: Exception):
+        """Record an error the caller handled itself (e.g. a stream cut off part way)"""
+        self.outcome = classify_error(error)
+
+
+class LLMMetrics:
+    """Per-call LLM metrics: a ring buffer of recent calls, process counters, and the llm_calls table and Prometheus export, written off the calling thread"""
+
+    def __init__(self, db=None, ring_size: int = RING_SIZE, export_path: Optional[str] = None):
+        self.db = db
+        self.export_path = export_path
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=ring_size)
+        self._calls: Dict[tuple, int] = {}
+        self._tokens: Dict[tuple, int] = {}
+        self._latency: Dict[str, Dict] = {}
+        self._server = None
+        # Records waiting for the writer thread, which owns the llm_calls writes and the export file
+        self._pending = queue.Queue()
+        self._writer = None
+        self._write_lock = threading.Lock()
+        self._exported = 0.0
+        self._unexported = False
+
+    @contextmanager
+    def track(self, call_site: str, question_type: Optional[str] = None, difficulty: Optional[str] = None):
+        """Time the enclosed call and record it, classifying any exception it raises"""
+        call = LLMCall(call_site, question_type, difficulty)
+        started = time.perf_counter()
+        try:
+            yield call
+        except Exception as e:
+            call.mark_error(e)
+            raise
+        finally:
+            self.record(call, time.perf_counter() - started)
+
+    def record_cache_hit(self, call_site: str, question_type: Optional[str] = None,
+                         difficulty: Optional[str] = None, seconds: float = 0.0):
+        """Record a request answered from a cache without calling the LLM"""
+        call = LLMCall(call_site, question_type, difficulty)
+        call.mark_cache_hit()
+        self.record(call, seconds)
+
+    def record(self, call: LLMCall, seconds: float):
+        record = {
+            'timestamp': datetime.now().isoformat(),
+            'call_site': call.call_site,
+            'question_type': call.question_type,
+            'difficulty': call.difficulty,
+            'outcome': call.outcome,
+            'cache_hit': call.cache_hit,
+            'latency_ms': seconds * 1000,
+            'prompt_tokens': call.prompt_tokens,
+            'response_tokens': call.response_tokens
+        }
+
+        with self._lock:
+            self._recent.append(record)
+            key = (call.call_site, call.outcome, "hit" if call.cache_hit else "miss")
+            self._calls[key] = self._calls.get(key, 0) + 1
+            for direction, tokens in (("prompt", call.prompt_tokens), ("response", call.response_tokens)):
+                if tokens:
+                    self._tokens[(call.call_site, direction)] = self._tokens.get((call.call_site, direction), 0) + tokens
+            if not call.cache_hit:
+                histogram = self._latency.setdefault(
+                    call.call_site, {'buckets': [0] * len(LATENCY_BUCKETS), 'sum': 0.0, 'count': 0}
+                )
+                for i, bound in enumerate(LATENCY_BUCKETS):
+                    if seconds <= bound:
+                        histogram['buckets'][i] += 1
+                histogram['sum'] += seconds
+                histogram['count'] += 1
+
+        if self.db is not None or self.export_path:
+            self._pending.put(record)
+            self._start_writer()
+
+    def _start_writer(self):
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="llm-metrics-writer", daemon=True)
+                self._writer.start()
+
+    def _write_loop(self):
+        """Write queued records to llm_calls in batches and rewrite the export at most every PROMETHEUS_WRITE_INTERVAL"""
+        while True:
+            try:
+                batch = [self._pending.get(timeout=PROMETHEUS_WRITE_INTERVAL)]
+            except queue.Empty:
+                batch = []
+            while batch and len(batch) < WRITE_BATCH_SIZE:
+                try:
+                    batch.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+            self._write(batch, force=False)
+
+    def _write(self, batch: List[Dict], force: bool):
+        # Metrics must never fail the call they measure
+        try:
+            with self._write_lock:
+                if batch and self.db is not None:
+                    self.db.record_llm_calls(batch)
+                self._unexported = self._unexported or bool(batch)
+                due = self._unexported and time.monotonic() - self._exported >= PROMETHEUS_WRITE_INTERVAL
+                if self.export_path and (force or due):
+                    self.write_prometheus(self.export_path)
+                    self._exported = time.monotonic()
+                    self._unexported = False
+        except Exception:
+            pass
+        finally:
+            for _ in batch:
+                self._pending.task_done()
+
+    def flush(self):
+        """Wait until every recorded call is stored, then rewrite the export (e.g. before a script exits)"""
+        if self._writer is not None:
+            self._pending.join()
+        self._write([], force=True)
+
+    def recent(self, call_site: Optional[str] = None) -> List[Dict]:
+        """Recent call records, oldest first"""
+        with self._lock:
+            return [record for record in self._recent if call_site is None or record['call_site'] == call_site]
+
+    def get_stats(self) -> Dict[str, Dict]:
+        """Per call site summary of the recent calls: outcomes, cache hits, latency percentiles and tokens"""
+        stats = {}
+        for record in self.recent():
+            site = stats.setdefault(record['call_site'], {
+                'calls': 0, 'cache_hits': 0, 'outcomes': {outcome: 0 for outcome in OUTCOMES},
+                'latencies': [], 'prompt_tokens': 0, 'response_tokens': 0, 'metered': 0
+            })
+            site['calls'] += 1
+            site['outcomes'][record['outcome']] += 1
+            if record['cache_hit']:
+                site['cache_hits'] += 1
+                continue
+            site['latencies'].append(record['latency_ms'] / 1000)
+            if record['prompt_tokens'] is not None or record['response_tokens'] is not None:
+                site['metered'] += 1
+                site['prompt_tokens'] += record['prompt_tokens'] or 0
+                site['response_tokens'] += record['response_tokens'] or 0
+
+        for site in stats.values():
+            latencies = sorted(site.pop('latencies'))
+            for percentile in (50, 95, 99):
+                site[f"p{percentile}"] = _percentile(latencies, percentile)
+            metered = site.pop('metered')
+            site['avg_tokens'] = (site['prompt_tokens'] + site['response_tokens']) / metered if metered else None
+        return stats
+
+    def prometheus_text(self) -> str:
+        """Process counters in the Prometheus text exposition format"""
+        with self._lock:
+            calls = dict(self._calls)
+            tokens = dict(self._tokens)
+            latency = {site: {'buckets': list(h['buckets']), 'sum': h['sum'], 'count': h['count']}
+                       for site, h in self._latency.items()}
+
+        lines = [
+            "# HELP llm_calls_total LLM calls by call site, outcome and cache result.",
+            "# TYPE llm_calls_total counter"
+        ]
+        for (site, outcome, cache), count in sorted(calls.items()):
+            lines.append(f'llm_calls_total{{call_site="{_label(site)}",outcome="{outcome}",cache="{cache}"}} {count}')
+
+        lines += [
+            "# HELP llm_tokens_total Tokens reported by the model, by call site and direction.",
+            "# TYPE llm_tokens_total counter"
+        ]
+        for (site, direction), count in sorted(tokens.items()):
+            lines.append(f'llm_tokens_total{{call_site="{_label(site)}",direction="{direction}"}} {count}')
+
+        lines += [
+            "# HELP llm_call_duration_seconds Time spent on LLM calls (cache hits excluded), including retries.",
+            "# TYPE llm_call_duration_seconds histogram"
+        ]
+        for site, histogram in sorted(latency.items()):
+            label = f'call_site="{_label(site)}"'
+            for bound, count in zip(LATENCY_BUCKETS, histogram['buckets']):
+                lines.append(f'llm_call_duration_seconds_bucket{{{label},le="{bound:g}"}} {count}')
+            lines.append(f'llm_call_duration_seconds_bucket{{{label},le="+Inf"}} {histogram["count"]}')
+            lines.append(f'llm_call_duration_seconds_sum{{{label}}} {histogram["sum"]:.6f}')
+            lines.append(f'llm_call_duration_seconds_count{{{label}}} {histogram["count"]}')
+
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str):
+        """Write the export atomically, e.g. for node_exporter's textfile collector"""
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus_text())
+        os.replace(temp_path, path)
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """Serve the export at http://host:port/metrics from a daemon thread"""
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus_text().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=self._server.serve_forever, name="llm-metrics", daemon=True).start()
+        return self._server
@@ -0,0 +1,69 @@
+import threading
+from typing import Dict, Optional, Tuple
+
+DEFAULT_MODEL = "gemini-2.5-flash"
+
+_QUESTION = {
+    "type": "OBJECT",
+    "properties": {
+        "question": {"type": "STRING"},
+        "type": {"type": "STRING"},
+        "options": {"type": "ARRAY", "items": {"type": "STRING"}},
+        "correct_answer": {"type": "STRING"},
+        "explanation": {"type": "STRING"},
+        "difficulty": {"type": "STRING"}
+    },
+    "required": ["question", "type", "correct_answer", "explanation", "difficulty"]
+}
+
+_EVALUATION_PROPERTIES = {
+    "is_correct": {"type": "BOOLEAN"},
+    "score": {"type": "INTEGER"},
+    "feedback": {"type": "STRING"}
+}
+
+# Response schemas for structured output, by the kind of request they constrain
+RESPONSE_SCHEMAS = {
+    "questions": {"type": "ARRAY", "items": _QUESTION},
+    "evaluation": {
+        "type": "OBJECT",
+        "properties": _EVALUATION_PROPERTIES,
+        "required": ["is_correct", "score", "feedback"]
+    },
+    "image_evaluation": {
+        "type": "OBJECT",
+        "properties": {"extracted_answer": {"type": "STRING"}, **_EVALUATION_PROPERTIES},
+        "required": ["extracted_answer", "is_correct", "score", "feedback"]
+    },
+    "evaluations": {
+        "type": "ARRAY",
+        "items": {
+            "type": "OBJECT",
+            "properties": {"index": {"type": "INTEGER"}, **_EVALUATION_PROPERTIES},
+            "required": ["index", "is_correct", "score", "feedback"]
+        }
+    }
+}
+
+_lock = threading.Lock()
+_models: Dict[Tuple[str, Optional[str]], object] = {}
+
+
+def get_model(model_name: str = DEFAULT_MODEL, schema: Optional[str] = None):
+    """Shared model client, constrained to JSON matching RESPONSE_SCHEMAS[schema] if one is named"""
+    # Imported here so the replay backend works without the Gemini SDK installed
+    import google.generativeai as genai
+
+    key = (model_name, schema)
+    with _lock:
+        model = _models.get(key)
+        if model is None:
+            generation_config = None
+            if schema is not None:
+                generation_config = {
+                    "response_mime_type": "application/json",
+                    "response_schema": RESPONSE_SCHEMAS[schema]
+                }
+            model = genai.GenerativeModel(model_name, generation_config=generation_config)
+            _models[key] = model
+    return model
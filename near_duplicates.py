@@ -0,0 +1,177 @@
+import hashlib
+import random
+import re
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+# Word shingle length, and LSH layout: BANDS bands of ROWS MinHash values each.
+# With 20 x 3, pairs at Jaccard 0.6 become candidates ~99% of the time, pairs at 0.3 ~40%.
+SHINGLE_SIZE = 3
+BANDS = 20
+ROWS = 3
+SIMILARITY_THRESHOLD = 0.6
+
+# Recent questions remembered per topic for "avoid these" prompts
+RECENT_PER_GROUP = 200
+
+# Per check: bucket entries scanned (most selective buckets first), and the candidates sharing
+# the most bands whose exact Jaccard similarity is computed
+MAX_CANDIDATE_SCAN = 1000
+MAX_EXACT_CHECKS = 8
+
+# Per-shingle permutation values kept in memory; questions on a topic share most shingles
+SIGNATURE_CACHE_SIZE = 100000
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 64) - 1
+_WORD = re.compile(r"[a-z0-9']+")
+
+_rng = random.Random(20240601)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME)) for _ in range(BANDS * ROWS)
+]
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> FrozenSet[str]:
+    """Overlapping word n-grams of a normalized question"""
+    words = _WORD.findall(str(text or '').casefold())
+    if len(words) <= size:
+        return frozenset([" ".join(words)]) if words else frozenset()
+    return frozenset(" ".join(words[i:i + size]) for i in range(len(words) - size + 1))
+
+
+_signature_cache: Dict[str, Tuple[int, ...]] = {}
+
+
+def _shingle_values(shingle: str) -> Tuple[int, ...]:
+    """One permuted hash per MinHash permutation, from a stable (not per-process salted) hash"""
+    values = _signature_cache.get(shingle)
+    if values is None:
+        h = int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'little')
+        values = tuple((a * h + b) % _MERSENNE_PRIME for a, b in _PERMUTATIONS)
+        if len(_signature_cache) >= SIGNATURE_CACHE_SIZE:
+            _signature_cache.clear()
+        _signature_cache[shingle] = values
+    return values
+
+
+def minhash(shingle_set: FrozenSet[str]) -> List[int]:
+    """MinHash signature with one value per permutation"""
+    if not shingle_set:
+        return [_MAX_HASH] * len(_PERMUTATIONS)
+    return list(map(min, zip(*map(_shingle_values, shingle_set))))
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class NearDuplicateIndex:
+    """MinHash/LSH index of past questions, built incrementally from history and the question bank"""
+
+    def __init__(self, threshold: float = SIMILARITY_THRESHOLD):
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._texts: List[str] = []
+        self._shingles: List[FrozenSet[str]] = []
+        self._keys: Dict[FrozenSet[str], int] = {}
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], List[int]] = defaultdict(list)
+        self._recent: Dict[str, deque] = defaultdict(lambda: deque(maxlen=RECENT_PER_GROUP))
+        self._watermarks = (0, 0)
+        self._stats = {'checked': 0, 'rejected': 0, 'check_seconds': 0.0}
+
+    def _bands(self, signature: List[int]):
+        for band in range(BANDS):
+            yield band, tuple(signature[band * ROWS:(band + 1) * ROWS])
+
+    def _add(self, text: str, shingle_set: FrozenSet[str], group: Optional[str]) -> bool:
+        if not shingle_set or shingle_set in self._keys:
+            return False
+        item_id = len(self._texts)
+        self._texts.append(text)
+        self._shingles.append(shingle_set)
+        self._keys[shingle_set] = item_id
+        for bucket in self._bands(minhash(shingle_set)):
+            self._buckets[bucket].append(item_id)
+        if group is not None:
+            self._recent[group].append(item_id)
+        return True
+
+    def add(self, text: str, group: Optional[str] = None) -> bool:
+        """Index a question, returning False if the same wording is already indexed"""
+        with self._lock:
+            return self._add(text, shingles(text), group)
+
+    def _similar(self, shingle_set: FrozenSet[str], threshold: float,
+                 limit: int = MAX_EXACT_CHECKS) -> List[Tuple[float, int]]:
+        # Shared bands estimate similarity; only the top few candidates get an exact Jaccard.
+        # Huge buckets come from template phrases every question shares, so they are read last.
+        buckets = sorted((self._buckets.get(bucket, ()) for bucket in self._bands(minhash(shingle_set))), key=len)
+        shared_bands = Counter()
+        scanned = 0
+        for bucket in buckets:
+            if scanned >= MAX_CANDIDATE_SCAN:
+                break
+            shared_bands.update(bucket)
+            scanned += len(bucket)
+        matches = [(jaccard(shingle_set, self._shingles[item_id]), item_id)
+                   for item_id, _ in shared_bands.most_common(limit)]
+        return sorted((match for match in matches if match[0] >= threshold), reverse=True)
+
+    def find_similar(self, text: str, threshold: Optional[float] = None) -> List[Tuple[float, str]]:
+        """Indexed questions at least threshold similar to text, most similar first"""
+        with self._lock:
+            matches = self._similar(shingles(text), self.threshold if threshold is None else threshold)
+            return [(similarity, self._texts[item_id]) for similarity, item_id in matches]
+
+    def filter_new(self, questions: List[Dict], group: Optional[str] = None) -> Tuple[List[Dict], List[Dict]]:
+        """Split generated questions into (new, repeats), indexing the new ones as they are accepted"""
+        kept, repeats = [], []
+        with self._lock:
+            for question_data in questions:
+                started = time.perf_counter()
+                shingle_set = shingles(question_data.get('question'))
+                is_repeat = shingle_set in self._keys or bool(self._similar(shingle_set, self.threshold))
+                if not is_repeat:
+                    self._add(str(question_data.get('question')), shingle_set, group)
+                self._stats['checked'] += 1
+                self._stats['rejected'] += is_repeat
+                self._stats['check_seconds'] += time.perf_counter() - started
+                (repeats if is_repeat else kept).append(question_data)
+        return kept, repeats
+
+    def closest(self, texts: List[str], count: int) -> List[str]:
+        """The count indexed questions most similar to any of texts"""
+        best: Dict[int, float] = {}
+        with self._lock:
+            for text in texts:
+                for similarity, item_id in self._similar(shingles(text), 0.0, max(count, MAX_EXACT_CHECKS)):
+                    best[item_id] = max(similarity, best.get(item_id, 0.0))
+            ranked = sorted(best, key=best.get, reverse=True)[:count]
+            return [self._texts[item_id] for item_id in ranked]
+
+    def recent(self, group: str, count: int) -> List[str]:
+        """The count most recently indexed questions for a group (topic)"""
+        with self._lock:
+            return [self._texts[item_id] for item_id in list(self._recent.get(group, ()))[-count:]]
+
+    def refresh(self, db):
+        """Index questions added to history or the question bank since the last refresh"""
+        with self._lock:
+            history_id, bank_id = self._watermarks
+        rows, history_id, bank_id = db.get_questions_since(history_id, bank_id)
+        with self._lock:
+            for grammar_topic, question in rows:
+                self._add(question, shingles(question), grammar_topic)
+            self._watermarks = (max(history_id, self._watermarks[0]), max(bank_id, self._watermarks[1]))
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['indexed'] = len(self._texts)
+        stats['avg_check_ms'] = stats['check_seconds'] * 1000 / stats['checked'] if stats['checked'] else 0.0
+        return stats
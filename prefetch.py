@@ -0,0 +1,98 @@
+import threading
+import time
+from concurrent.futures import Executor, Future, wait
+from typing import Callable, Dict, List, Optional, Tuple
+
+# (grammar_topic, question_type, difficulty)
+QuizKey = Tuple[str, str, str]
+
+DIFFICULTY_ORDER = ["Easy", "Medium", "Hard"]
+
+
+def predict_next_keys(key: QuizKey) -> List[QuizKey]:
+    """Most likely next quiz requests: the same combination, then the next harder difficulty"""
+    grammar_topic, question_type, difficulty = key
+    keys = [key]
+    if difficulty in DIFFICULTY_ORDER:
+        position = DIFFICULTY_ORDER.index(difficulty)
+        if position + 1 < len(DIFFICULTY_ORDER):
+            keys.append((grammar_topic, question_type, DIFFICULTY_ORDER[position + 1]))
+    return keys
+
+
+class PrefetchCache:
+    """Bounded TTL cache of speculatively generated quizzes with hit/miss/waste counters"""
+
+    def __init__(self, executor: Executor, max_entries: int = 4, ttl: float = 1800):
+        self.executor = executor
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: Dict[QuizKey, Tuple[Future, float]] = {}
+        self._lock = threading.Lock()
+        self._stats = {'started': 0, 'hits': 0, 'misses': 0, 'wasted': 0}
+
+    def _evict_expired(self, now: float):
+        for key, (future, created_at) in list(self._entries.items()):
+            if now - created_at > self.ttl:
+                future.cancel()
+                del self._entries[key]
+                self._stats['wasted'] += 1
+
+    def prefetch(self, key: QuizKey, generate: Callable[..., List[Dict]]) -> bool:
+        """Start generate(*key) in the background unless the key is already cached"""
+        with self._lock:
+            now = time.monotonic()
+            self._evict_expired(now)
+            if key in self._entries:
+                return False
+
+            if len(self._entries) >= self.max_entries:
+                # Make room by dropping the oldest speculative result
+                oldest = min(self._entries, key=lambda k: self._entries[k][1])
+                self._entries.pop(oldest)[0].cancel()
+                self._stats['wasted'] += 1
+
+            self._entries[key] = (self.executor.submit(generate, *key), now)
+            self._stats['started'] += 1
+            return True
+
+    def take(self, key: QuizKey, timeout: float = 0) -> Optional[List[Dict]]:
+        """Claim a prefetched quiz if it is ready within timeout seconds, otherwise leave it running"""
+        with self._lock:
+            self._evict_expired(time.monotonic())
+            entry = self._entries.get(key)
+
+        if entry is not None and not wait([entry[0]], timeout=timeout).done:
+            # Still generating: the caller falls back to live generation and a later quiz can claim it
+            with self._lock:
+                self._stats['misses'] += 1
+            return None
+
+        with self._lock:
+            if entry is not None and self._entries.get(key) is entry:
+                del self._entries[key]
+            else:
+                entry = None
+
+        questions = None
+        if entry is not None:
+            try:
+                questions = entry[0].result()
+            except Exception:
+                questions = None
+
+        with self._lock:
+            if questions:
+                self._stats['hits'] += 1
+            else:
+                self._stats['misses'] += 1
+                if entry is not None:
+                    self._stats['wasted'] += 1
+
+        return questions or None
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._entries)
+        return stats
@@ -0,0 +1,182 @@
+from functools import partial
+from typing import Dict, List, Optional
+
+from llm_backend import QUESTIONS, LLMBackend, LLMResponse
+from llm_metrics import GENERATE_QUESTIONS, LLMMetrics
+from near_duplicates import NearDuplicateIndex
+from question_validation import QuestionValidator
+from rate_limiter import RateLimiter, GENERATION, SPECULATIVE
+from resilience import call_with_resilience
+from response_parser import parse_json_array
+
+# Grammar topics
+GRAMMAR_TOPICS = [
+    "Tenses",
+    "Subject-Verb Agreement",
+    "Articles (a, an, the)",
+    "Prepositions",
+    "Pronouns",
+    "Adjectives and Adverbs",
+    "Conditionals",
+    "Passive Voice",
+    "Reported Speech",
+    "Modal Verbs",
+    "Phrasal Verbs",
+    "Relative Clauses",
+    "Conjunctions",
+    "Gerunds and Infinitives",
+    "Punctuation",
+    "Sentence Structure",
+    "Common Grammar Mistakes",
+    "Mixed Grammar Topics"
+]
+
+TENSE_SUBTOPICS = ["Present", "Past", "Future"]
+
+QUESTION_TYPES = [
+    "Multiple Choice (MCQ)",
+    "Fill in the Blanks",
+    "True/False",
+    "Sentence Correction",
+    "Short Answer",
+    "Essay/Paragraph Writing"
+]
+
+DIFFICULTY_LEVELS = ["Easy", "Medium", "Hard"]
+
+
+def quiz_topics() -> List[str]:
+    """Every topic a quiz can be generated for, with Tenses split the way the quiz page names them"""
+    topics = []
+    for topic in GRAMMAR_TOPICS:
+        if topic == "Tenses":
+            topics.extend(f"{tense} Tense" for tense in TENSE_SUBTOPICS)
+            topics.append("Tenses (General)")
+        else:
+            topics.append(topic)
+    return topics
+
+
+def build_generation_prompt(grammar_topic: str, question_type: str, difficulty: str, count: int = 10,
+                            avoid: Optional[List[str]] = None, structured: bool = True) -> str:
+    """Build the Gemini prompt for a batch of grammar questions"""
+    if structured:
+        # The response schema already defines the JSON layout
+        response_format = f'Use type "{question_type}" and difficulty "{difficulty}" for every question; include options only for MCQ.'
+    else:
+        response_format = f"""Please provide the response as a JSON array with {count} questions in this format:
+[
+  {{
+    "question": "The question text",
+    "type": "{question_type}",
+    "options": ["option1", "option2", "option3", "option4"],  // Only if MCQ
+    "correct_answer": "The correct answer",
+    "explanation": "Brief explanation of the correct answer",
+    "difficulty": "{difficulty}"
+  }},
+  // ... {count-1} more questions
+]"""
+
+    prompt = f"""Generate {count} unique English grammar questions about '{grammar_topic}'.
+
+Question Type: {question_type}
+Difficulty Level: {difficulty}
+
+{response_format}
+
+Make sure:
+- All {count} questions are unique and educational
+- For MCQ, provide 4 options for each question
+- Questions match the {difficulty} difficulty level
+- Questions are diverse and cover different aspects of '{grammar_topic}'"""
+
+    if avoid:
+        past_questions = "\n".join(f"- {question}" for question in avoid)
+        prompt += f"""
+
+Do not repeat or closely paraphrase any of these past questions:
+{past_questions}"""
+
+    return prompt
+
+
+def call_llm(limiter: RateLimiter, backend: LLMBackend, name: str, kind: str, contents, priority: int,
+             deadline: float, retries: int = 2, hedge: bool = True, rate_limit_wait: float = 60) -> LLMResponse:
+    """One backend request behind the rate limiter, with a deadline, retries and hedging"""
+    def attempt(timeout: float, attempt_priority: int = priority):
+        limiter.acquire(attempt_priority, min(rate_limit_wait, timeout))
+        return backend.complete(kind, contents, timeout)
+
+    # A hedged duplicate only runs if it fits in the budget without touching the reserve
+    hedge_attempt = partial(attempt, attempt_priority=SPECULATIVE) if hedge else None
+    return call_with_resilience(name, attempt, deadline, retries, hedge=hedge_attempt)
+
+
+class QuestionGenerator:
+    """Validated, never-seen question batches from the LLM backend, shared by the app and the bank builder"""
+
+    def __init__(self, db, limiter: RateLimiter, index: NearDuplicateIndex, backend: LLMBackend,
+                 structured: bool = True, timeout: float = 120, retries: int = 2, hedge: bool = True,
+                 avoid_count: int = 15, metrics: Optional[LLMMetrics] = None):
+        self.db = db
+        self.limiter = limiter
+        self.index = index
+        self.backend = backend
+        self.structured = structured
+        self.timeout = timeout
+        self.retries = retries
+        self.hedge = hedge
+        self.avoid_count = avoid_count
+        self.metrics = metrics or LLMMetrics()
+
+    def prompt(self, grammar_topic: str, question_type: str, difficulty: str, count: int,
+               avoid: Optional[List[str]] = None) -> str:
+        """Generation prompt, by default listing the topic's most recent past questions to avoid"""
+        if avoid is None:
+            avoid = self.index.recent(grammar_topic, self.avoid_count)
+        return build_generation_prompt(grammar_topic, question_type, difficulty, count, avoid, self.structured)
+
+    def request_raw_questions(self, grammar_topic: str, question_type: str, difficulty: str, count: int,
+                              priority: int = GENERATION, avoid: Optional[List[str]] = None) -> List[Dict]:
+        """Make one generation request and return the parsed, unvalidated questions"""
+        with self.metrics.track(GENERATE_QUESTIONS, question_type, difficulty) as call:
+            response = call_llm(
+                self.limiter, self.backend, "generate questions", QUESTIONS,
+                self.prompt(grammar_topic, question_type, difficulty, count, avoid),
+                priority, self.timeout, self.retries, self.hedge
+            )
+            call.set_response(response)
+
+            # Parse JSON response, keeping whatever complete questions arrived
+            questions = parse_json_array(response.text)
+            if not questions:
+                call.mark_parse_failure()
+            return questions
+
+    def request_batch_questions(self, grammar_topic: str, question_type: str, difficulty: str, count: int = 10,
+                                existing: Optional[List[Dict]] = None, priority: int = GENERATION) -> List[Dict]:
+        """Generate validated, never-seen questions, raising on failure (safe to call from worker threads)"""
+        self.index.refresh(self.db)
+
+        validator = QuestionValidator(question_type, difficulty, existing or [])
+        raw_questions = self.request_raw_questions(grammar_topic, question_type, difficulty, count, priority)
+        questions, repeats = self.index.filter_new(validator.validate_all(raw_questions), grammar_topic)
+
+        shortfall = count - len(questions)
+        if shortfall > 0:
+            questions.extend(self.top_up_questions(
+                grammar_topic, question_type, difficulty, shortfall, validator, repeats, priority
+            ))
+
+        return questions[:count]
+
+    def top_up_questions(self, grammar_topic: str, question_type: str, difficulty: str, shortfall: int,
+                         validator: QuestionValidator, repeats: List[Dict],
+                         priority: int = GENERATION, surplus: int = 0) -> List[Dict]:
+        """Request only the dropped shortfall (plus surplus questions to bank), avoiding the past questions the repeats resembled"""
+        avoid = self.index.closest([question['question'] for question in repeats], self.avoid_count)
+        raw_questions = self.request_raw_questions(
+            grammar_topic, question_type, difficulty, shortfall + surplus, priority, avoid or None
+        )
+        questions, _ = self.index.filter_new(validator.validate_all(raw_questions), grammar_topic)
+        return questions[:shortfall + surplus]
@@ -0,0 +1,87 @@
+from typing import Dict, Iterable, List, Optional
+
+from grading import match_option, normalize_answer, normalize_bool
+
+MCQ_TYPE = "Multiple Choice (MCQ)"
+MCQ_OPTION_COUNT = 4
+
+
+def _clean(text) -> str:
+    """Collapse whitespace in a text field, treating None as empty"""
+    return " ".join(str(text).split()) if text is not None else ""
+
+
+def question_key(question_data: Dict) -> str:
+    """Key under which two questions count as duplicates"""
+    return normalize_answer(question_data.get('question'))
+
+
+def normalize_question(question_data, question_type: str, difficulty: Optional[str] = None) -> Optional[Dict]:
+    """Normalize a generated question and repair small defects, returning None if it is unusable"""
+    if not isinstance(question_data, dict):
+        return None
+
+    question = _clean(question_data.get('question'))
+    correct_answer = _clean(question_data.get('correct_answer'))
+    if not question or not correct_answer:
+        return None
+
+    # A missing type is filled in from the request; a different type is the wrong kind of question
+    item_type = _clean(question_data.get('type')) or question_type
+    if normalize_answer(item_type) != normalize_answer(question_type):
+        return None
+
+    repaired = dict(question_data)
+    repaired.update({
+        'question': question,
+        'type': question_type,
+        'correct_answer': correct_answer,
+        'explanation': _clean(question_data.get('explanation'))
+    })
+    if difficulty and not _clean(question_data.get('difficulty')):
+        repaired['difficulty'] = difficulty
+
+    if question_type == MCQ_TYPE:
+        raw_options = question_data.get('options')
+        options = [_clean(option) for option in raw_options] if isinstance(raw_options, list) else []
+        distinct = {normalize_answer(option) for option in options}
+        if len(options) != MCQ_OPTION_COUNT or len(distinct) != MCQ_OPTION_COUNT or "" in distinct:
+            return None
+
+        # The answer must be one of the options verbatim, or the radio button can never match it
+        # (an answer equal to an option's text, like 'a' among articles, is never read as a letter)
+        matched = match_option(correct_answer, options)
+        if matched is None:
+            return None
+        repaired['options'] = options
+        repaired['correct_answer'] = matched
+    elif question_type == "True/False":
+        value = normalize_bool(correct_answer)
+        if value is None:
+            return None
+        repaired['correct_answer'] = "True" if value else "False"
+
+    return repaired
+
+
+class QuestionValidator:
+    """Validate and repair generated questions, dropping invalid ones and duplicates of any seen so far"""
+
+    def __init__(self, question_type: str, difficulty: Optional[str] = None, existing: Iterable[Dict] = ()):
+        self.question_type = question_type
+        self.difficulty = difficulty
+        self._seen = {question_key(question_data) for question_data in existing}
+        self.dropped = 0
+
+    def validate(self, question_data) -> Optional[Dict]:
+        """Return the repaired question, or None if it is invalid or a duplicate"""
+        question = normalize_question(question_data, self.question_type, self.difficulty)
+        if question is None or question_key(question) in self._seen:
+            self.dropped += 1
+            return None
+        self._seen.add(question_key(question))
+        return question
+
+    def validate_all(self, questions: Iterable) -> List[Dict]:
+        """Validate a batch, keeping only the usable, unique questions in order"""
+        return [question for question in map(self.validate, questions or []) if question is not None]
@@ -0,0 +1,76 @@
+import threading
+import time
+from typing import Dict
+
+# Call priorities, most urgent first
+INTERACTIVE = 0   # grading an answer the learner is waiting on
+GENERATION = 1    # questions for a quiz that has already started
+SPECULATIVE = 2   # prefetching quizzes that may never be requested
+
+PERIODS = {'minute': 60, 'day': 24 * 3600}
+
+
+class RateLimitExceeded(Exception):
+    """Raised when the shared Gemini request budget cannot cover a call in time"""
+
+
+class RateLimiter:
+    """Per-minute and per-day token buckets, persisted in the database and shared by all sessions"""
+
+    def __init__(self, db, per_minute: int, per_day: int, speculative_reserve: float = 0.2):
+        self.db = db
+        self.limits = {
+            'minute': (per_minute, PERIODS['minute']),
+            'day': (per_day, PERIODS['day'])
+        }
+        self._speculative_reserve = {
+            'minute': per_minute * speculative_reserve,
+            'day': per_day * speculative_reserve
+        }
+        self._condition = threading.Condition()
+        self._waiting = {INTERACTIVE: 0, GENERATION: 0, SPECULATIVE: 0}
+
+    def _higher_priority_waiting(self, priority: int) -> bool:
+        return any(count for level, count in self._waiting.items() if level < priority)
+
+    def acquire(self, priority: int = INTERACTIVE, timeout: float = 60):
+        """Spend one request from the budget, waiting up to timeout seconds for it to refill"""
+        if priority == SPECULATIVE:
+            # Speculative calls never wait and leave a share of the budget for the learner
+            with self._condition:
+                busy = self._higher_priority_waiting(priority)
+            if busy or self.db.acquire_rate_tokens(self.limits, self._speculative_reserve) > 0:
+                raise RateLimitExceeded("Skipping prefetch to keep the remaining quota for quizzes in progress")
+            return
+
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            self._waiting[priority] += 1
+
+        try:
+            while True:
+                with self._condition:
+                    while self._higher_priority_waiting(priority):
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise RateLimitExceeded("Timed out waiting for the Gemini quota budget")
+                        self._condition.wait(min(remaining, 1.0))
+
+                wait = self.db.acquire_rate_tokens(self.limits)
+                if wait == 0:
+                    return
+                if time.monotonic() + wait > deadline:
+                    raise RateLimitExceeded(
+                        f"Gemini quota budget used up; the next request is available in {wait:.0f} seconds"
+                    )
+
+                with self._condition:
+                    self._condition.wait(min(wait, 1.0))
+        finally:
+            with self._condition:
+                self._waiting[priority] -= 1
+                self._condition.notify_all()
+
+    def remaining(self) -> Dict[str, int]:
+        """Whole requests left in each bucket"""
+        return {name: int(level) for name, level in self.db.get_rate_limit_levels(self.limits).items()}
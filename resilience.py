@@ -0,0 +1,151 @@
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Optional
+
+from rate_limiter import RateLimitExceeded
+
+# Attempts run on their own threads so a stuck request can be abandoned at its deadline
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="gemini-call")
+
+# Latency samples kept per operation, and how many are needed before hedging
+LATENCY_WINDOW = 200
+HEDGE_MIN_SAMPLES = 20
+
+_TRANSIENT_NAMES = ("DeadlineExceeded", "ServiceUnavailable", "InternalServerError",
+                    "ServerError", "GatewayTimeout", "BadGateway", "Timeout", "ConnectionError")
+_TRANSIENT_MESSAGES = ("500", "502", "503", "504", "deadline", "timed out", "timeout",
+                       "unavailable", "internal error", "connection reset")
+
+_lock = threading.Lock()
+_latencies: Dict[str, deque] = {}
+_stats = {'calls': 0, 'retries': 0, 'hedged': 0, 'hedge_wins': 0, 'deadline_exceeded': 0}
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a call (including its retries) does not finish before its deadline"""
+
+
+def is_quota_error(error: Exception) -> bool:
+    """Quota errors must not be retried: retrying only burns more of the quota"""
+    message = str(error).lower()
+    return (isinstance(error, RateLimitExceeded) or type(error).__name__ in ("ResourceExhausted", "TooManyRequests")
+            or "quota" in message or "429" in message)
+
+
+def is_transient_error(error: Exception) -> bool:
+    """5xx responses, timeouts and dropped connections, which are worth retrying"""
+    if is_quota_error(error):
+        return False
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    code = getattr(error, 'code', None)
+    if isinstance(code, int) and 500 <= code < 600:
+        return True
+    if any(name in type(error).__name__ for name in _TRANSIENT_NAMES):
+        return True
+    message = str(error).lower()
+    return any(marker in message for marker in _TRANSIENT_MESSAGES)
+
+
+def record_latency(name: str, seconds: float):
+    with _lock:
+        _latencies.setdefault(name, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+
+
+def latency_percentile(name: str, percentile: float = 95) -> Optional[float]:
+    """Recent latency percentile for an operation, or None until enough samples exist"""
+    with _lock:
+        samples = sorted(_latencies.get(name, ()))
+    if len(samples) < HEDGE_MIN_SAMPLES:
+        return None
+    return samples[min(len(samples) - 1, int(len(samples) * percentile / 100))]
+
+
+def get_resilience_stats() -> Dict:
+    """Return retry and hedging counters plus recent p50/p95/p99 latency per operation"""
+    with _lock:
+        stats = dict(_stats)
+        names = list(_latencies)
+    stats['latency'] = {}
+    for name in names:
+        with _lock:
+            samples = sorted(_latencies[name])
+        stats['latency'][name] = {
+            f"p{p}": samples[min(len(samples) - 1, int(len(samples) * p / 100))] for p in (50, 95, 99)
+        }
+    return stats
+
+
+def _count(key: str):
+    with _lock:
+        _stats[key] += 1
+
+
+def _run_attempt(name: str, attempt: Callable, timeout: float, hedge: Optional[Callable]):
+    """Run one attempt, starting a hedged duplicate if it is slower than the recent p95"""
+    started = time.monotonic()
+    primary = _executor.submit(attempt, timeout)
+    pending = {primary}
+
+    hedge_after = latency_percentile(name) if hedge else None
+    if hedge_after is not None and hedge_after < timeout:
+        done, _ = wait(pending, timeout=hedge_after)
+        if not done:
+            _count('hedged')
+            pending.add(_executor.submit(hedge, timeout - (time.monotonic() - started)))
+
+    error = None
+    while pending:
+        remaining = timeout - (time.monotonic() - started)
+        done, pending = wait(pending, timeout=max(0.0, remaining), return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for future in done:
+            try:
+                result = future.result()
+            except Exception as e:
+                # The other request may still succeed; a hedge that could not get quota is not an error
+                if not (future is not primary and isinstance(e, RateLimitExceeded)):
+                    error = error or e
+                continue
+            if future is not primary:
+                _count('hedge_wins')
+            record_latency(name, time.monotonic() - started)
+            return result
+
+    if error is not None:
+        raise error
+    raise DeadlineExceeded(f"{name} did not respond within {timeout:.1f} seconds")
+
+
+def call_with_resilience(name: str, attempt: Callable[[float], object], deadline: float,
+                         retries: int = 2, base_delay: float = 1.0, max_delay: float = 8.0,
+                         hedge: Optional[Callable[[float], object]] = None):
+    """Call attempt(timeout) under a deadline, retrying transient errors and optionally hedging slow calls"""
+    _count('calls')
+    deadline_at = time.monotonic() + deadline
+
+    for retry in range(retries + 1):
+        remaining = deadline_at - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            return _run_attempt(name, attempt, remaining, hedge)
+        except Exception as e:
+            if retry == retries or not is_transient_error(e):
+                if isinstance(e, DeadlineExceeded):
+                    _count('deadline_exceeded')
+                raise
+
+        # Full jitter keeps sessions that failed together from retrying together
+        delay = random.uniform(0, min(max_delay, base_delay * 2 ** retry))
+        if time.monotonic() + delay >= deadline_at:
+            break
+        _count('retries')
+        time.sleep(delay)
+
+    _count('deadline_exceeded')
+    raise DeadlineExceeded(f"{name} did not complete within {deadline:g} seconds")
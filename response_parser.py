@@ -0,0 +1,213 @@
+import json
+import re
+import threading
+from typing import Callable, Dict, List, Optional
+
+# Python-style literals the model sometimes writes instead of JSON ones
+_LITERALS = {'True': 'true', 'False': 'false', 'None': 'null'}
+_LITERAL = re.compile(r'\b(True|False|None)\b')
+_CLOSERS = {'[': ']', '{': '}'}
+
+_stats_lock = threading.Lock()
+_stats = {'responses': 0, 'clean': 0, 'repaired': 0, 'salvaged': 0, 'failed': 0, 'dropped_elements': 0}
+
+
+def _record(outcome: str, count: int = 1):
+    with _stats_lock:
+        _stats[outcome] += count
+        if outcome != 'dropped_elements':
+            _stats['responses'] += count
+
+
+def get_parse_stats() -> Dict:
+    """Return how many model responses parsed cleanly, needed repair, were salvaged or failed"""
+    with _stats_lock:
+        stats = dict(_stats)
+    parsed = stats['clean'] + stats['repaired'] + stats['salvaged']
+    stats['success_rate'] = parsed / stats['responses'] * 100 if stats['responses'] else 100.0
+    return stats
+
+
+def repair_json(text: str) -> str:
+    """Fix common model JSON defects outside strings: trailing commas and Python literals"""
+    repaired = []
+    in_string = False
+    escape = False
+    pos = 0
+
+    while pos < len(text):
+        char = text[pos]
+        if in_string:
+            if escape:
+                escape = False
+            elif char == '\\':
+                escape = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == ',':
+            # Drop a comma that is only followed by whitespace and a closing bracket
+            rest = text[pos + 1:].lstrip()
+            if rest[:1] in (']', '}'):
+                pos += 1
+                continue
+        elif char in 'TFN':
+            match = _LITERAL.match(text, pos)
+            if match and (pos == 0 or not (text[pos - 1].isalnum() or text[pos - 1] == '_')):
+                repaired.append(_LITERALS[match.group(1)])
+                pos = match.end()
+                continue
+        repaired.append(char)
+        pos += 1
+
+    return ''.join(repaired)
+
+
+def _loads(text: str):
+    """json.loads, retrying once on the repaired text; returns (value, repaired)"""
+    try:
+        return json.loads(text), False
+    except ValueError:
+        return json.loads(repair_json(text)), True
+
+
+def _matching_close(text: str, start: int) -> Optional[int]:
+    """Index of the bracket closing the one at start, or None if the text is truncated"""
+    stack = []
+    in_string = False
+    escape = False
+
+    for pos in range(start, len(text)):
+        char = text[pos]
+        if in_string:
+            if escape:
+                escape = False
+            elif char == '\\':
+                escape = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in _CLOSERS:
+            stack.append(_CLOSERS[char])
+        elif stack and char == stack[-1]:
+            stack.pop()
+            if not stack:
+                return pos
+
+    return None
+
+
+def _is_object_array(value) -> bool:
+    return isinstance(value, list) and all(isinstance(item, dict) for item in value)
+
+
+def _parse_payload(text: str, opener: str, accept: Callable = lambda value: True):
+    """Parse the first complete JSON value starting with opener that accept() takes, or raise ValueError"""
+    start = text.find(opener)
+    while start >= 0:
+        end = _matching_close(text, start)
+        if end is None:
+            break
+
+        # Bracketed prose such as "[10] questions" can be valid JSON too, so keep looking past it
+        try:
+            value, repaired = _loads(text[start:end + 1])
+        except ValueError:
+            pass
+        else:
+            if accept(value):
+                _record('repaired' if repaired else 'clean')
+                return value
+        start = text.find(opener, end + 1)
+
+    raise ValueError(f"No complete JSON value starting with '{opener}' in response")
+
+
+def parse_json_object(text: str) -> Dict:
+    """Find and parse the JSON object in a model response (code fences, prose and minor defects allowed)"""
+    try:
+        return _parse_payload(text, '{')
+    except ValueError:
+        _record('failed')
+        raise
+
+
+def parse_json_array(text: str) -> List[Dict]:
+    """Find and parse the JSON array in a model response, keeping every complete element if it is damaged"""
+    try:
+        return _parse_payload(text, '[', _is_object_array)
+    except ValueError:
+        pass
+
+    # Truncated or damaged array: salvage the elements that did arrive intact
+    parser = IncrementalArrayParser()
+    items = parser.feed(text)
+    if items:
+        _record('salvaged')
+        return items
+
+    _record('failed')
+    raise ValueError("No JSON array elements could be recovered from response")
+
+
+class IncrementalArrayParser:
+    """Parse a streamed JSON array of objects, emitting each object as soon as it is complete"""
+
+    def __init__(self):
+        self._buffer = ''
+        self._pos = 0
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._object_start = None
+
+    def feed(self, chunk: str) -> List[Dict]:
+        """Add the next chunk of response text and return any objects it completed"""
+        self._buffer += chunk
+        items = []
+
+        while self._pos < len(self._buffer):
+            char = self._buffer[self._pos]
+
+            if not self._started:
+                # Skip code fences or any leading text before the array opens
+                if char == '[':
+                    self._started = True
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == '{':
+                if self._depth == 0:
+                    self._object_start = self._pos
+                self._depth += 1
+            elif char == '}' and self._depth > 0:
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        items.append(_loads(self._buffer[self._object_start:self._pos + 1])[0])
+                    except ValueError:
+                        # A malformed element should not take the rest of the batch down with it
+                        _record('dropped_elements')
+                    self._object_start = None
+
+            self._pos += 1
+
+        # Drop text that can no longer be part of an unfinished object
+        if self._object_start is None:
+            self._buffer = ''
+            self._pos = 0
+        elif self._object_start > 0:
+            self._buffer = self._buffer[self._object_start:]
+            self._pos -= self._object_start
+            self._object_start = 0
+
+        return items